@@ -0,0 +1,243 @@
+"""
+批量压缩目录中的.npy/.npz文件
+
+遍历源目录, 在进程池中把每个数组写成压缩容器 (见container.py), 输出目录保持
+相同的相对路径. 每完成一个文件就追加一行到输出目录的manifest.jsonl,
+中断后重新运行会跳过已完成且未修改的文件. 最后汇总总压缩率和吞吐量.
+
+用法:
+    python batch.py data/ archive/ --workers 8
+    python batch.py data/ archive/ --codec auto
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from container import write_container
+from registry import is_parallel_safe, list_codecs
+
+MANIFEST = 'manifest.jsonl'
+SUMMARY = 'summary.json'
+PATTERNS = ('.npy', '.npz')
+
+
+def iter_files(src: str) -> Iterator[str]:
+    """按相对路径顺序列出源目录下的.npy/.npz文件"""
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(PATTERNS):
+                yield os.path.relpath(os.path.join(root, name), src)
+
+
+def _file_key(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_manifest(dst: str) -> Dict[str, dict]:
+    """读取已完成文件的记录, 忽略中断时写了一半的最后一行"""
+    done = {}
+    path = os.path.join(dst, MANIFEST)
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            done[record['file']] = record
+    return done
+
+
+def _write_atomic(path: str, data: np.ndarray, codec: str) -> int:
+    """先写临时文件再改名, 中断不会留下不完整的输出"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    size, _ = write_container(tmp, data, codec=codec)
+    os.replace(tmp, path)
+    return size
+
+
+def compress_file(src: str, dst: str, rel: str, codec: str) -> dict:
+    """
+    压缩单个文件
+
+    .npy写为 <rel>.npc; .npz中的每个数组写为 <rel>.d/<键>.npc
+
+    返回:
+        与compare_compression_methods结果相同结构的统计信息, 另含文件名
+    """
+    start = time.time()
+    path = os.path.join(src, rel)
+    try:
+        original_size = compressed_size = 0
+        if rel.endswith('.npy'):
+            # 内存映射读取, 容器按块读取数据
+            data = np.load(path, mmap_mode='r')
+            compressed_size += _write_atomic(os.path.join(dst, rel + '.npc'), data, codec)
+            original_size += data.nbytes
+        else:
+            with np.load(path) as arrays:
+                for key in arrays.files:
+                    data = arrays[key]
+                    out = os.path.join(dst, rel + '.d', f'{key}.npc')
+                    compressed_size += _write_atomic(out, data, codec)
+                    original_size += data.nbytes
+        compress_time = time.time() - start
+        return {
+            'file': rel,
+            'codec': codec,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_ratio': original_size / max(compressed_size, 1),
+            'compress_time': compress_time,
+            # MB/s
+            'throughput_compress': original_size / max(compress_time, 1e-6) / (1024**2),
+            'available': True,
+            'error': None,
+        }
+    except Exception as e:
+        return {'file': rel, 'codec': codec, 'available': False, 'error': str(e)}
+
+
+def available_codecs() -> List[str]:
+    """可以用于批量压缩的编码器名称 (已安装的无损编码器和auto)"""
+    return [c.name for c in list_codecs(lossless=True)] + ['auto']
+
+
+def _run_files(src: str, dst: str, pending: List[str], codec: str,
+               workers: int = None) -> Iterator[Tuple[str, dict]]:
+    """按完成顺序给出 (相对路径, 统计信息); 编码器不能并行调用时在主进程中串行压缩"""
+    if workers == 1 or not is_parallel_safe(codec):
+        for rel in pending:
+            yield rel, compress_file(src, dst, rel, codec)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(compress_file, src, dst, rel, codec): rel
+                   for rel in pending}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def compress_directory(src: str, dst: str, codec: str = 'shuffle+zlib',
+                       workers: int = None, resume: bool = True) -> Dict[str, dict]:
+    """
+    批量压缩目录
+
+    参数:
+        src: 源目录
+        dst: 输出目录
+        codec: get_compression_methods中的方法名称, 'auto'为每块自动选择
+        workers: 进程数, 默认为CPU核数
+        resume: 是否跳过manifest中已完成且未修改的文件
+
+    返回:
+        {相对路径: 统计信息}
+    """
+    if codec not in available_codecs():
+        raise ValueError(f"未知或不可用的编码器: {codec}, 可选 {available_codecs()}")
+    os.makedirs(dst, exist_ok=True)
+    done = load_manifest(dst) if resume else {}
+    files = list(iter_files(src))
+
+    results = {}
+    pending = []
+    for rel in files:
+        record = done.get(rel)
+        if record and record['available'] and record['codec'] == codec and \
+                tuple(record['source']) == _file_key(os.path.join(src, rel)):
+            results[rel] = record
+        else:
+            pending.append(rel)
+    print(f"共 {len(files)} 个文件, 已完成 {len(results)}, 待压缩 {len(pending)}")
+
+    start = time.time()
+    mode = 'a' if resume else 'w'
+    with open(os.path.join(dst, MANIFEST), mode) as manifest:
+        for i, (rel, info) in enumerate(_run_files(src, dst, pending, codec, workers), 1):
+            info['source'] = list(_file_key(os.path.join(src, rel)))
+            results[rel] = info
+            manifest.write(json.dumps(info) + '\n')
+            manifest.flush()
+
+            if info['available']:
+                print(f"[{i}/{len(pending)}] {rel}: {info['compression_ratio']:.2f}x, "
+                      f"{info['throughput_compress']:.2f} MB/s")
+            else:
+                print(f"[{i}/{len(pending)}] {rel}: 失败 {info['error']}")
+
+    summary = summarize(results, pending, time.time() - start)
+    with open(os.path.join(dst, SUMMARY), 'w') as f:
+        json.dump(summary, f, indent=2)
+    print_summary(summary)
+    return results
+
+
+def summarize(results: Dict[str, dict], compressed_now: List[str], wall_time: float) -> dict:
+    """
+    汇总总压缩率和吞吐量
+
+    压缩率包含之前已完成的文件; 吞吐量只统计本次运行压缩的文件, 按墙钟时间计算.
+    """
+    ok = [r for r in results.values() if r['available']]
+    original_size = sum(r['original_size'] for r in ok)
+    compressed_size = sum(r['compressed_size'] for r in ok)
+    now = [results[rel] for rel in compressed_now if results[rel]['available']]
+    now_size = sum(r['original_size'] for r in now)
+    return {
+        'files': len(results),
+        'compressed_now': len(now),
+        'failed': [r['file'] for r in results.values() if not r['available']],
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'compression_ratio': original_size / max(compressed_size, 1),
+        'wall_time': wall_time,
+        'cpu_time': sum(r['compress_time'] for r in now),
+        # MB/s
+        'throughput_compress': now_size / max(wall_time, 1e-6) / (1024**2),
+    }
+
+
+def print_summary(summary: dict):
+    """打印汇总"""
+    print("\n批量压缩汇总:")
+    print(f"  文件数: {summary['files']}, 本次压缩: {summary['compressed_now']}, "
+          f"失败: {len(summary['failed'])}")
+    print(f"  原始大小: {summary['original_size']/1024**2:.2f} MB")
+    print(f"  压缩后大小: {summary['compressed_size']/1024**2:.2f} MB")
+    print(f"  总压缩率: {summary['compression_ratio']:.2f}x")
+    print(f"  墙钟时间: {summary['wall_time']:.2f} sec")
+    print(f"  吞吐量: {summary['throughput_compress']:.2f} MB/s")
+    for rel in summary['failed']:
+        print(f"  失败: {rel}")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量压缩目录中的.npy/.npz文件")
+    parser.add_argument('src', help="源目录")
+    parser.add_argument('dst', help="输出目录")
+    parser.add_argument('--codec', default='shuffle+zlib',
+                        help="压缩方法名称, 默认shuffle+zlib; auto为每块自动选择, "
+                             "容器的块较小时试压缩的开销较大")
+    parser.add_argument('--workers', type=int, default=None, help="进程数")
+    parser.add_argument('--no-resume', action='store_true',
+                        help="忽略已有的manifest, 全部重新压缩")
+    args = parser.parse_args(argv)
+    if args.codec not in available_codecs():
+        parser.error(f"未知或不可用的编码器: {args.codec}, 可选 {available_codecs()}")
+
+    results = compress_directory(args.src, args.dst, codec=args.codec,
+                                 workers=args.workers, resume=not args.no_resume)
+    return 0 if all(r['available'] for r in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+压缩方法基准测试
+
+每种方法先预热, 再重复N次, 用perf_counter_ns计时, 报告吞吐量的
+中位数/四分位距/最小值, 结果可写为JSON/CSV, 并可与保存的基线比较以发现性能回退.
+
+用法:
+    python benchmark.py --repeat 7 --json run.json
+    python benchmark.py --baseline run.json --tolerance 0.1
+"""
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import zlib
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from main import get_compression_methods
+from registry import REGISTRY
+
+# 写入CSV的字段
+CSV_FIELDS = [
+    'method', 'original_size', 'compressed_size', 'compression_ratio',
+    'compress_median', 'compress_iqr', 'compress_min',
+    'decompress_median', 'decompress_iqr', 'decompress_min',
+    'compress_peak_bytes', 'decompress_peak_bytes',
+    'available', 'error',
+]
+
+
+def import_modules() -> List[str]:
+    """需要测量导入时间的模块: 本目录的脚本和所有已注册编码器的后端"""
+    import more  # noqa: F401  注册有损编码器
+    backends = {m for codecs in REGISTRY.values()
+                for codec in codecs.values() for m in codec.requires}
+    return ['numpy', 'main', 'more'] + sorted(backends)
+
+
+def measure_import_times(modules: List[str] = None) -> Dict[str, float]:
+    """
+    在独立的子进程中测量每个模块的冷启动导入时间 (秒)
+
+    未安装的模块记为None.
+    """
+    modules = modules or import_modules()
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = {}
+    for module in modules:
+        if module not in ('main', 'more') and importlib.util.find_spec(module) is None:
+            times[module] = None
+            continue
+        code = ("import time; start = time.perf_counter(); "
+                f"import {module}; print(time.perf_counter() - start)")
+        proc = subprocess.run([sys.executable, '-c', code], cwd=here,
+                              capture_output=True, text=True)
+        times[module] = float(proc.stdout.strip()) if proc.returncode == 0 else None
+    return times
+
+
+def _throughput_stats(nbytes: int, times_ns: List[int]) -> dict:
+    """由每次耗时计算吞吐量 (MB/s) 统计"""
+    throughput = nbytes / np.maximum(np.array(times_ns, dtype=np.float64), 1) \
+        * 1e9 / (1024**2)
+    q1, median, q3 = np.percentile(throughput, [25, 50, 75])
+    return {
+        'median': float(median),
+        'iqr': float(q3 - q1),
+        'min': float(throughput.min()),
+        'times_ns': [int(t) for t in times_ns],
+    }
+
+
+def measure_peak_memory(data: np.ndarray, compress_fn: Callable,
+                        decompress_fn: Callable) -> dict:
+    """
+    用tracemalloc测量压缩和解压各自的峰值内存分配 (字节)
+
+    单独运行一次, 不影响计时结果.
+    """
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        compressed, _ = compress_fn(data)
+        compress_peak = tracemalloc.get_traced_memory()[1] - base
+
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        decompress_fn(compressed, data.shape, data.dtype)
+        decompress_peak = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return {'compress_peak_bytes': compress_peak,
+            'decompress_peak_bytes': decompress_peak}
+
+
+def benchmark_method(data: np.ndarray, compress_fn: Callable, decompress_fn: Callable,
+                     warmup: int = 1, repeat: int = 5, measure_memory: bool = True) -> dict:
+    """
+    对单个压缩方法做重复计时
+
+    参数:
+        data: 要压缩的numpy数组
+        compress_fn, decompress_fn: compress_*/decompress_*函数对
+        warmup: 不计入统计的预热次数
+        repeat: 计时次数
+        measure_memory: 是否额外运行一次测量峰值内存
+
+    返回:
+        统计信息字典
+    """
+    for _ in range(warmup):
+        compressed, _ = compress_fn(data)
+        decompress_fn(compressed, data.shape, data.dtype)
+
+    compress_ns, decompress_ns = [], []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        compressed, _ = compress_fn(data)
+        compress_ns.append(time.perf_counter_ns() - start)
+
+        start = time.perf_counter_ns()
+        decompress_fn(compressed, data.shape, data.dtype)
+        decompress_ns.append(time.perf_counter_ns() - start)
+
+    result = {
+        'original_size': data.nbytes,
+        'compressed_size': len(compressed),
+        'compression_ratio': data.nbytes / len(compressed),
+        'compress': _throughput_stats(data.nbytes, compress_ns),
+        'decompress': _throughput_stats(data.nbytes, decompress_ns),
+        'available': True,
+        'error': None,
+    }
+    if measure_memory:
+        result.update(measure_peak_memory(data, compress_fn, decompress_fn))
+    return result
+
+
+def run_benchmark(data: np.ndarray, methods: Dict[str, tuple] = None,
+                  warmup: int = 1, repeat: int = 5, measure_memory: bool = True,
+                  measure_imports: bool = True) -> dict:
+    """
+    对所有方法运行基准测试
+
+    返回:
+        {'meta': 运行环境, 'results': {方法名: 统计信息}}
+    """
+    if methods is None:
+        methods = get_compression_methods()
+    if not methods:
+        raise ValueError("没有要测试的方法")
+    results = {}
+    for name, (compress_fn, decompress_fn) in methods.items():
+        try:
+            results[name] = benchmark_method(
+                data, compress_fn, decompress_fn, warmup=warmup, repeat=repeat,
+                measure_memory=measure_memory)
+        except Exception as e:
+            results[name] = {'available': False, 'error': str(e)}
+
+    return {
+        'meta': {
+            'python': sys.version.split()[0],
+            'numpy': np.__version__,
+            'zlib': zlib.ZLIB_RUNTIME_VERSION,
+            'platform': platform.platform(),
+            'shape': list(data.shape),
+            'dtype': str(data.dtype),
+            'warmup': warmup,
+            'repeat': repeat,
+            'import_times': measure_import_times() if measure_imports else {},
+        },
+        'results': results,
+    }
+
+
+def save_json(run: dict, path: str):
+    """保存为JSON"""
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+
+
+def load_json(path: str) -> dict:
+    """读取JSON"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_csv(run: dict, path: str):
+    """保存为CSV, 每种方法一行"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for name, info in run['results'].items():
+            row = {'method': name, 'available': info['available'],
+                   'error': info['error']}
+            if info['available']:
+                row.update({k: info.get(k) for k in (
+                    'original_size', 'compressed_size', 'compression_ratio',
+                    'compress_peak_bytes', 'decompress_peak_bytes')})
+                for stage in ('compress', 'decompress'):
+                    for stat in ('median', 'iqr', 'min'):
+                        row[f'{stage}_{stat}'] = info[stage][stat]
+            writer.writerow(row)
+
+
+def compare_runs(baseline: dict, current: dict, tolerance: float = 0.1) -> List[dict]:
+    """
+    与基线比较, 找出性能回退
+
+    吞吐量中位数比基线低超过tolerance (且超出基线四分位距), 或压缩率下降,
+    都记为回退.
+
+    返回:
+        回退列表, 每项包含方法名, 指标, 基线值和当前值
+    """
+    regressions = []
+    for name, base in baseline['results'].items():
+        info = current['results'].get(name)
+        # 本次未测试的方法不参与比较
+        if info is None or not base['available']:
+            continue
+        if not info['available']:
+            regressions.append({'method': name, 'metric': 'available',
+                                'baseline': True, 'current': False})
+            continue
+
+        for stage in ('compress', 'decompress'):
+            base_median = base[stage]['median']
+            limit = min(base_median * (1 - tolerance),
+                        base_median - base[stage]['iqr'])
+            if info[stage]['median'] < limit:
+                regressions.append({'method': name, 'metric': f'{stage}_median',
+                                    'baseline': base_median,
+                                    'current': info[stage]['median']})
+
+        if info['compression_ratio'] < base['compression_ratio'] * (1 - 1e-6):
+            regressions.append({'method': name, 'metric': 'compression_ratio',
+                                'baseline': base['compression_ratio'],
+                                'current': info['compression_ratio']})
+    return regressions
+
+
+def print_benchmark(run: dict):
+    """打印基准测试结果"""
+    print(f"\n{'method':<22} {'ratio':>8} {'comp_med':>10} {'comp_iqr':>10} "
+          f"{'comp_min':>10} {'dec_med':>10} {'dec_iqr':>10} {'dec_min':>10} "
+          f"{'comp_peak_MB':>13} {'dec_peak_MB':>12}")
+    for name, info in run['results'].items():
+        if not info['available']:
+            print(f"{name:<22} unavailable: {info['error']}")
+            continue
+        c, d = info['compress'], info['decompress']
+        print(f"{name:<22} {info['compression_ratio']:>8.3f} "
+              f"{c['median']:>10.2f} {c['iqr']:>10.2f} {c['min']:>10.2f} "
+              f"{d['median']:>10.2f} {d['iqr']:>10.2f} {d['min']:>10.2f} "
+              f"{info.get('compress_peak_bytes', float('nan')) / 1024**2:>13.2f} "
+              f"{info.get('decompress_peak_bytes', float('nan')) / 1024**2:>12.2f}")
+
+
+def print_import_times(run: dict):
+    """打印导入时间"""
+    times = run['meta'].get('import_times')
+    if not times:
+        return
+    print(f"\n{'module':<24} {'import (ms)':>12}")
+    for module, seconds in times.items():
+        cell = f"{seconds * 1000:>12.1f}" if seconds is not None else f"{'-':>12}"
+        print(f"{module:<24} {cell}")
+
+
+def print_regressions(regressions: List[dict]):
+    """打印回退列表"""
+    if not regressions:
+        print("\nno regressions")
+        return
+    print("\nREGRESSIONS:")
+    for r in regressions:
+        print(f"  {r['method']}: {r['metric']} {r['baseline']} -> {r['current']}")
+
+
+def make_demo_data(rows: int = 500, cols: int = 500, seed: int = 0) -> np.ndarray:
+    """与main.py示例相同的测试数据, 固定随机种子以便多次运行可比"""
+    rng = np.random.default_rng(seed)
+    arr = rng.random((rows, cols), dtype=np.float32)
+    arr[::10, ::10] = 1.0
+    return arr
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="压缩方法基准测试")
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--cols', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--methods', nargs='*', help="只测试这些方法")
+    parser.add_argument('--no-memory', action='store_true',
+                        help="不测量峰值内存")
+    parser.add_argument('--no-imports', action='store_true',
+                        help="不测量模块导入时间")
+    parser.add_argument('--json', help="结果写入JSON文件")
+    parser.add_argument('--csv', help="结果写入CSV文件")
+    parser.add_argument('--baseline', help="与之比较的基线JSON文件")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="允许的吞吐量下降比例")
+    args = parser.parse_args(argv)
+
+    data = make_demo_data(args.rows, args.cols)
+    methods = get_compression_methods()
+    if args.methods is not None:
+        unknown = [k for k in args.methods if k not in methods]
+        if unknown or not args.methods:
+            parser.error(f"未知的方法: {unknown}, 可选 {list(methods)}")
+        methods = {k: v for k, v in methods.items() if k in args.methods}
+
+    run = run_benchmark(data, methods, warmup=args.warmup, repeat=args.repeat,
+                        measure_memory=not args.no_memory,
+                        measure_imports=not args.no_imports)
+    print_benchmark(run)
+    print_import_times(run)
+
+    if args.json:
+        save_json(run, args.json)
+    if args.csv:
+        save_csv(run, args.csv)
+
+    if args.baseline:
+        regressions = compare_runs(load_json(args.baseline), run,
+                                   tolerance=args.tolerance)
+        print_regressions(regressions)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
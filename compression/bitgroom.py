@@ -0,0 +1,216 @@
+"""
+尾数截断 (bit rounding) 有损编码器
+
+按目标精度把每个浮点数尾数的低位舍入为0, 再交给无损字节编码器:
+    - digits: 保留的十进制有效数字位数, 所有值保留相同的尾数位数
+      keepbits = ceil(digits * log2(10)), 相对误差不超过 0.5 * 10**-digits.
+      非规格化数的有效位数本来就少于keepbits, 保持不变
+    - abs_error: 绝对误差上限, 按每个值的指数分别计算可以丢掉的尾数位数
+舍入是对比特模式的整数运算 (加半个单位再屏蔽低位), 全部向量化,
+NaN/inf保持不变. 低位全为0的数据byte-shuffle后很容易压缩.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 目标类型(1) | 元素字节数(1) | 维数(1) | 目标值(d)
+    | 后端名称长度(B) | 后端名称 | 形状(Q * 维数) | 后端压缩的数据
+"""
+import math
+import struct
+import time
+from functools import partial
+from typing import Tuple
+
+import numpy as np
+
+from filters import make_filtered_pair
+from main import compress_zlib, decompress_zlib
+
+MAGIC = b'BGRM'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBd')
+TARGETS = ['digits', 'abs_error']
+
+DEFAULT_DIGITS = 3
+# 每次处理的元素个数
+GROOM_CHUNK = 256 * 1024
+
+
+def _compress_raw(data: np.ndarray) -> Tuple[bytes, float]:
+    start = time.time()
+    return np.ascontiguousarray(data).tobytes(), time.time() - start
+
+
+def _decompress_raw(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
+    start = time.time()
+    return np.frombuffer(compressed, dtype=dtype).reshape(original_shape).copy(), time.time() - start
+
+
+# 截断后的数据低字节大多为0, zlib用最快的级别即可.
+# 'raw'不再压缩, 只截断 (GB/s), 用于交给压缩文件系统/容器或单独测量截断的吞吐量
+BACKENDS = {
+    'shuffle+zlib': make_filtered_pair('shuffle', partial(compress_zlib, level=1),
+                                       decompress_zlib),
+    'bitshuffle+zlib': make_filtered_pair('bitshuffle', partial(compress_zlib, level=1),
+                                          decompress_zlib),
+    'zlib': (partial(compress_zlib, level=1), decompress_zlib),
+    'raw': (_compress_raw, _decompress_raw),
+}
+DEFAULT_BACKEND = 'shuffle+zlib'
+
+# 元素字节数 -> (无符号整数类型, 尾数位数)
+_LAYOUT = {
+    2: (np.uint16, 10),
+    4: (np.uint32, 23),
+    8: (np.uint64, 52),
+}
+
+
+def _drop_bits(bits: np.ndarray, mantissa_bits: int, target: str, value: float):
+    """每个值可以丢掉的尾数位数 (标量或与bits同形的数组)"""
+    if target == 'digits':
+        keep = math.ceil(value * math.log2(10))
+        return max(0, mantissa_bits - keep)
+    # 舍入误差不超过半个保留单位: 2**(E - mantissa_bits + drop - 1) <= abs_error
+    width = bits.dtype.itemsize * 8
+    biased = ((bits >> np.array(mantissa_bits, bits.dtype))
+              & np.array((1 << (width - 1 - mantissa_bits)) - 1, bits.dtype)).astype(np.int64)
+    bias = (1 << (width - 2 - mantissa_bits)) - 1
+    exponent = np.maximum(biased, 1) - bias
+    drop = math.floor(math.log2(value)) - exponent + mantissa_bits + 1
+    return np.clip(drop, 0, mantissa_bits)
+
+
+def groom(data: np.ndarray, digits: float = None, abs_error: float = None) -> np.ndarray:
+    """
+    按目标精度把尾数低位舍入为0
+
+    参数:
+        digits: 保留的十进制有效数字位数
+        abs_error: 绝对误差上限, 给出时忽略digits
+    """
+    if data.dtype.itemsize not in _LAYOUT or data.dtype.kind != 'f':
+        raise ValueError(f"bit rounding只支持float16/32/64, 不支持 {data.dtype}")
+    uint_dtype, mantissa_bits = _LAYOUT[data.dtype.itemsize]
+    target, value = ('abs_error', abs_error) if abs_error is not None \
+        else ('digits', DEFAULT_DIGITS if digits is None else digits)
+    if not value > 0:
+        raise ValueError(f"{target} 必须为正数: {value}")
+
+    bits = np.ascontiguousarray(data).view(uint_dtype).reshape(-1)
+    out = np.empty_like(bits)
+    one = uint_dtype(1)
+    exponent_mask = uint_dtype(((1 << (8 * data.dtype.itemsize - 1)) - 1)
+                               & ~((1 << mantissa_bits) - 1))
+    # 分块处理, 临时数组留在缓存里
+    for i in range(0, bits.size, GROOM_CHUNK):
+        x = bits[i:i + GROOM_CHUNK]
+        y = out[i:i + GROOM_CHUNK]
+        drop = np.asarray(_drop_bits(x, mantissa_bits, target, value)).astype(uint_dtype)
+        mask = ~((one << drop) - one)
+        # drop为0时half为0, mask为全1
+        half = (one << drop) >> one
+        # NaN/inf要在舍入之前判断: 尾数全1的NaN加half后会进位到指数和符号位
+        exponent = x & exponent_mask
+        special = exponent == exponent_mask
+        if target == 'digits':
+            # 非规格化数舍入后相对误差没有上界, 保持不变
+            special |= exponent == 0
+        np.add(x, half, out=y)
+        y &= mask
+        np.copyto(y, x, where=special)
+        # 最大的有限值向上舍入溢出为inf时改为直接截断. 这样的点很少
+        fix = np.flatnonzero(((y & exponent_mask) == exponent_mask) & ~special)
+        if fix.size:
+            y[fix] = x[fix] & (mask if mask.ndim == 0 else mask[fix])
+    return out.view(data.dtype).reshape(data.shape)
+
+
+def compress_bitgroom(data: np.ndarray, digits: float = None, abs_error: float = None,
+                      backend: str = DEFAULT_BACKEND) -> Tuple[bytes, float]:
+    """
+    尾数截断后用无损编码器压缩
+
+    参数:
+        digits: 保留的十进制有效数字位数, 都不给出时为3
+        abs_error: 绝对误差上限, 给出时忽略digits
+        backend: BACKENDS中的无损编码器名称
+    """
+    start = time.time()
+    groomed = groom(data, digits=digits, abs_error=abs_error)
+    target, value = ('abs_error', abs_error) if abs_error is not None \
+        else ('digits', DEFAULT_DIGITS if digits is None else digits)
+    payload, _ = BACKENDS[backend][0](groomed)
+
+    name = backend.encode()
+    header = HEADER.pack(MAGIC, VERSION, TARGETS.index(target), data.dtype.itemsize,
+                         data.ndim, value)
+    shape = struct.pack(f'<{data.ndim}Q', *data.shape)
+    return b''.join([header, bytes([len(name)]), name, shape, payload]), time.time() - start
+
+
+def decompress_bitgroom(compressed: bytes) -> Tuple[np.ndarray, float]:
+    """尾数截断解压 (只需无损解压)"""
+    start = time.time()
+    magic, version, _, itemsize, ndim, _ = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是bit rounding格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的bit rounding格式版本: {version}")
+    offset = HEADER.size
+    name_len = compressed[offset]
+    backend = bytes(compressed[offset + 1:offset + 1 + name_len]).decode()
+    offset += 1 + name_len
+    shape = struct.unpack_from(f'<{ndim}Q', compressed, offset)
+    offset += 8 * ndim
+
+    decompressed, _ = BACKENDS[backend][1](bytes(compressed[offset:]), shape,
+                                           np.dtype(f'<f{itemsize}'))
+    return np.asarray(decompressed).reshape(shape), time.time() - start
+
+
+# 示例用法
+if __name__ == "__main__":
+    from more import calculate_metrics
+
+    x = np.linspace(0, 1, 2000)
+    arr = (np.sin(10 * x)[:, None] * np.cos(10 * x)[None, :] * 300 + 15).astype(np.float32)
+    print(f"测试数组大小: {arr.shape} ({arr.nbytes/1024**2:.2f} MB)")
+
+    for params in ({'digits': 2}, {'digits': 3}, {'digits': 5}, {'abs_error': 1e-2}):
+        start = time.time()
+        groom(arr, **params)
+        groom_time = time.time() - start
+        compressed, compress_time = compress_bitgroom(arr, **params)
+        decompressed, decompress_time = decompress_bitgroom(compressed)
+        metrics = calculate_metrics(arr, decompressed)
+        print(f"{params}: {arr.nbytes / len(compressed):.2f}x, "
+              f"截断 {arr.nbytes / groom_time / 1024**2:.0f} MB/s, "
+              f"压缩 {arr.nbytes / compress_time / 1024**2:.0f} MB/s, "
+              f"解压 {arr.nbytes / decompress_time / 1024**2:.0f} MB/s, "
+              f"最大误差 {metrics['max_error']:.2e}, PSNR {metrics['psnr']:.2f} dB")
+
+    # NaN (含尾数全1的payload) 和 ±inf 往返后比特不变
+    for dtype, uint_dtype in ((np.float16, np.uint16), (np.float32, np.uint32),
+                              (np.float64, np.uint64)):
+        info = np.iinfo(uint_dtype)
+        sign = uint_dtype(1 << (8 * info.dtype.itemsize - 1))
+        special = np.array([info.max, info.max ^ sign,
+                            np.array(np.nan, dtype).view(uint_dtype),
+                            np.array(np.inf, dtype).view(uint_dtype),
+                            np.array(-np.inf, dtype).view(uint_dtype)], uint_dtype)
+        for params in ({'digits': 1}, {'abs_error': 1e3}):
+            compressed, _ = compress_bitgroom(special.view(dtype), **params)
+            decompressed, _ = decompress_bitgroom(compressed)
+            assert np.array_equal(decompressed.view(uint_dtype), special), (dtype, params)
+    print("NaN/inf往返检查通过")
+
+    # digits目标下包括非规格化数在内, 相对误差不超过 0.5 * 10**-digits
+    rng = np.random.default_rng(0)
+    for dtype, uint_dtype in ((np.float16, np.uint16), (np.float32, np.uint32)):
+        info = np.iinfo(uint_dtype)
+        values = rng.integers(0, info.max, 100000, dtype=uint_dtype, endpoint=True).view(dtype)
+        values = values[np.isfinite(values) & (values != 0)]
+        for digits in (1, 2, 3):
+            groomed = groom(values, digits=digits)
+            relative = np.abs(groomed.astype(np.float64) / values.astype(np.float64) - 1)
+            assert relative.max() <= 0.5 * 10.0**-digits, (dtype, digits, relative.max())
+    print("相对误差检查通过")
@@ -0,0 +1,192 @@
+"""
+内存中的压缩数组缓存
+
+数组写入时用get_compression_methods中的编码器压缩保存, 读取时 (__getitem__)
+再解压. 最近读取的若干数组以解压后的形式保存在一个小的LRU中, 避免反复解压.
+总内存 (压缩数据 + 热数组) 超过上限时, 先淘汰最久未用的热数组,
+仍然超出时再按LRU顺序丢弃压缩数据, 被丢弃的键再读取会抛出KeyError.
+
+用法:
+    cache = CompressedArrayCache(codec='shuffle+zlib', max_bytes=2 * 1024**3)
+    cache['field'] = arr
+    arr = cache['field']
+    print(cache.stats())
+"""
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, Union
+
+import numpy as np
+
+from main import get_compression_methods
+
+DEFAULT_CODEC = 'shuffle+zlib'
+# 解压后的热数组默认最多占用的字节数
+DEFAULT_HOT_BYTES = 256 * 1024**2
+
+
+class CompressedArrayCache:
+    """
+    压缩保存数组的字典式缓存
+
+    参数:
+        codec: get_compression_methods中的方法名称, 或(压缩函数, 解压函数)
+        max_bytes: 总内存上限, None表示不限制
+        hot_bytes: 解压后的热数组最多占用的字节数, 0表示不保留热数组
+    """
+
+    def __init__(self, codec: Union[str, Tuple[Callable, Callable]] = DEFAULT_CODEC,
+                 max_bytes: int = None, hot_bytes: int = DEFAULT_HOT_BYTES):
+        if isinstance(codec, str):
+            self._compress_fn, self._decompress_fn = get_compression_methods()[codec]
+        else:
+            self._compress_fn, self._decompress_fn = codec
+        self.max_bytes = max_bytes
+        self.hot_bytes = hot_bytes
+
+        # 键 -> (压缩数据, 形状, 数据类型), 按最近使用排序
+        self._store = OrderedDict()
+        # 键 -> 解压后的只读数组, 按最近使用排序
+        self._hot = OrderedDict()
+        self._compressed_size = 0
+        self._original_size = 0
+        self._hot_size = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.hot_evictions = 0
+        self.compress_time = 0.0
+        self.decompress_time = 0.0
+
+    @property
+    def memory_usage(self) -> int:
+        """压缩数据和热数组占用的字节数"""
+        return self._compressed_size + self._hot_size
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._store
+
+    def keys(self):
+        return self._store.keys()
+
+    def __setitem__(self, key: Hashable, data: np.ndarray):
+        data = np.asarray(data)
+        compressed, t = self._compress_fn(data)
+        self.compress_time += t
+        if self.max_bytes is not None and len(compressed) > self.max_bytes:
+            raise ValueError(f"{key!r} 压缩后 {len(compressed)} 字节, "
+                             f"超过缓存上限 {self.max_bytes} 字节")
+        if key in self._store:
+            del self[key]
+        self._store[key] = (compressed, data.shape, data.dtype)
+        self._compressed_size += len(compressed)
+        self._original_size += data.nbytes
+        self._enforce_limits()
+
+    def __getitem__(self, key: Hashable) -> np.ndarray:
+        """返回只读数组, 修改后需要重新写入"""
+        if key in self._hot:
+            self.hits += 1
+            self._hot.move_to_end(key)
+            self._store.move_to_end(key)
+            return self._hot[key]
+
+        self.misses += 1
+        compressed, shape, dtype = self._store[key]
+        self._store.move_to_end(key)
+        decompressed, t = self._decompress_fn(compressed, shape, dtype)
+        self.decompress_time += t
+        decompressed = np.asarray(decompressed).reshape(shape)
+        decompressed.flags.writeable = False
+
+        if decompressed.nbytes <= self.hot_bytes:
+            self._hot[key] = decompressed
+            self._hot_size += decompressed.nbytes
+            self._enforce_limits()
+        return decompressed
+
+    def __delitem__(self, key: Hashable):
+        compressed, shape, dtype = self._store.pop(key)
+        self._compressed_size -= len(compressed)
+        self._original_size -= int(np.prod(shape)) * dtype.itemsize
+        self._drop_hot(key)
+
+    def _drop_hot(self, key: Hashable):
+        hot = self._hot.pop(key, None)
+        if hot is not None:
+            self._hot_size -= hot.nbytes
+
+    def _enforce_limits(self):
+        """先按热数组上限, 再按总内存上限淘汰"""
+        while self._hot_size > self.hot_bytes:
+            self._drop_hot(next(iter(self._hot)))
+            self.hot_evictions += 1
+        if self.max_bytes is None:
+            return
+        while self._hot and self.memory_usage > self.max_bytes:
+            self._drop_hot(next(iter(self._hot)))
+            self.hot_evictions += 1
+        while self.memory_usage > self.max_bytes:
+            del self[next(iter(self._store))]
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """命中/未命中次数, 淘汰次数和节省的内存"""
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self._store),
+            'hot_entries': len(self._hot),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / requests if requests else 0.0,
+            'evictions': self.evictions,
+            'hot_evictions': self.hot_evictions,
+            'original_size': self._original_size,
+            'compressed_size': self._compressed_size,
+            'hot_size': self._hot_size,
+            'memory_usage': self.memory_usage,
+            # 相对于全部以解压形式保存
+            'bytes_saved': self._original_size - self.memory_usage,
+            'compress_time': self.compress_time,
+            'decompress_time': self.decompress_time,
+        }
+
+
+def print_cache_stats(stats: dict):
+    """打印缓存统计信息"""
+    print("\n压缩缓存统计:")
+    print(f"  条目数: {stats['entries']} (热数组 {stats['hot_entries']})")
+    print(f"  命中: {stats['hits']}, 未命中: {stats['misses']}, "
+          f"命中率: {stats['hit_rate']:.1%}")
+    print(f"  淘汰: {stats['evictions']}, 热数组淘汰: {stats['hot_evictions']}")
+    print(f"  原始大小: {stats['original_size']/1024**2:.2f} MB")
+    print(f"  占用内存: {stats['memory_usage']/1024**2:.2f} MB "
+          f"(压缩数据 {stats['compressed_size']/1024**2:.2f} MB)")
+    print(f"  节省内存: {stats['bytes_saved']/1024**2:.2f} MB")
+    print(f"  压缩时间: {stats['compress_time']:.3f} sec, "
+          f"解压时间: {stats['decompress_time']:.3f} sec")
+
+
+# 示例用法
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    cache = CompressedArrayCache(hot_bytes=16 * 1024**2)
+
+    # 模拟分析过程中的中间结果: 平滑场加少量噪声
+    x = np.linspace(0, 1, 512, dtype=np.float32)
+    start = time.time()
+    for i in range(100):
+        field = np.sin((i % 7 + 1) * x)[:, None] * np.cos(x * 3)[None, :]
+        field[rng.integers(0, 512, 100), rng.integers(0, 512, 100)] = 0
+        cache[f'step_{i}'] = field
+    print(f"写入100个数组: {time.time() - start:.3f} sec")
+
+    # 大部分访问集中在最近的几个数组
+    for _ in range(1000):
+        i = 99 - min(int(rng.exponential(3)), 99)
+        assert cache[f'step_{i}'].shape == (512, 512)
+    print_cache_stats(cache.stats())
@@ -0,0 +1,473 @@
+"""
+分块并行压缩引擎
+
+把数组沿第0维切成固定大小的块, 在进程池/线程池中并行压缩每个块,
+并在输出前部写入块索引, 使解压同样可以并行进行.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 每块行数(Q) | 块数(I) | 每块压缩长度(Q * 块数) | 块数据...
+
+自适应格式 (每块独立选择编码器):
+    AUTO_MAGIC(4) | 版本(1) | 每块行数(Q) | 块数(I) | 编码器数(B)
+    | 编码器名称表 (长度(B) + UTF-8名称) * 编码器数
+    | 每块 (编码器编号(B) + 压缩长度(Q)) | 块数据...
+"""
+import os
+import struct
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+MAGIC = b'CHNK'
+AUTO_MAGIC = b'CHNA'
+VERSION = 1
+HEADER = struct.Struct('<4sBQI')
+BLOCK_ENTRY = struct.Struct('<BQ')
+
+# 默认块大小 (字节)
+DEFAULT_BLOCK_SIZE = 1024**2
+
+# 自适应模式下每块用于预测的样本大小 (字节)
+DEFAULT_SAMPLE_SIZE = 64 * 1024
+
+
+def _make_executor(executor: str, workers: int):
+    """创建进程池或线程池"""
+    if executor == 'process':
+        return ProcessPoolExecutor(max_workers=workers)
+    if executor == 'thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    raise ValueError(f"未知的执行器类型: {executor}")
+
+
+def _rows_per_block(data: np.ndarray, block_size: int) -> int:
+    """计算每块包含的行数, 至少为1"""
+    row_nbytes = data.itemsize * int(np.prod(data.shape[1:]))
+    return max(1, block_size // max(row_nbytes, 1))
+
+
+def _compress_block(compress_fn: Callable, block: np.ndarray) -> bytes:
+    compressed, _ = compress_fn(np.ascontiguousarray(block))
+    return compressed
+
+
+def _decompress_block(decompress_fn: Callable, compressed: bytes,
+                      block_shape: tuple, dtype) -> np.ndarray:
+    decompressed, _ = decompress_fn(compressed, block_shape, dtype)
+    return np.asarray(decompressed).reshape(block_shape)
+
+
+def _map(fn: Callable, args: List[tuple], workers: int, executor: str) -> list:
+    """按顺序执行任务, workers为1时不创建池"""
+    if workers <= 1 or len(args) <= 1:
+        return [fn(*a) for a in args]
+    with _make_executor(executor, min(workers, len(args))) as pool:
+        return list(pool.map(fn, *zip(*args)))
+
+
+def read_block_index(compressed: bytes) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    读取块索引
+
+    返回:
+        (每块行数, [(偏移, 长度), ...])
+    """
+    magic, version, rows, n_blocks = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是分块压缩格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的分块格式版本: {version}")
+    lengths = struct.unpack_from(f'<{n_blocks}Q', compressed, HEADER.size)
+    offset = HEADER.size + 8 * n_blocks
+    index = []
+    for length in lengths:
+        index.append((offset, length))
+        offset += length
+    return rows, index
+
+
+def _block_shapes(original_shape: tuple, rows: int, n_blocks: int) -> List[tuple]:
+    """由原始形状和每块行数计算每块的形状"""
+    return [(min(rows, original_shape[0] - i * rows), *original_shape[1:])
+            for i in range(n_blocks)]
+
+
+def compress_chunked(data: np.ndarray, compress_fn: Callable,
+                     block_size: int = DEFAULT_BLOCK_SIZE,
+                     workers: int = None,
+                     executor: str = 'process') -> Tuple[bytes, float]:
+    """
+    分块并行压缩
+
+    参数:
+        data: 要压缩的numpy数组
+        compress_fn: 单块压缩函数, 与compress_*签名一致
+        block_size: 每块的目标大小 (字节)
+        workers: 并行数, 默认为CPU核数
+        executor: 'process' 或 'thread'
+
+    返回:
+        (压缩后的字节串, 耗时)
+    """
+    start = time.time()
+    workers = workers or os.cpu_count() or 1
+    rows = _rows_per_block(data, block_size)
+    blocks = [(compress_fn, data[i:i + rows])
+              for i in range(0, max(data.shape[0], 1), rows)]
+    payloads = _map(_compress_block, blocks, workers, executor)
+
+    header = HEADER.pack(MAGIC, VERSION, rows, len(payloads))
+    index = struct.pack(f'<{len(payloads)}Q', *[len(p) for p in payloads])
+    compressed = b''.join([header, index, *payloads])
+    return compressed, time.time() - start
+
+
+def decompress_chunked(compressed: bytes, original_shape: tuple, dtype,
+                       decompress_fn: Callable,
+                       workers: int = None,
+                       executor: str = 'process') -> Tuple[np.ndarray, float]:
+    """
+    分块并行解压
+
+    参数:
+        compressed: compress_chunked的输出
+        original_shape: 原始数组形状
+        dtype: 原始数据类型
+        decompress_fn: 单块解压函数, 与decompress_*签名一致
+        workers: 并行数, 默认为CPU核数
+        executor: 'process' 或 'thread'
+
+    返回:
+        (解压后的数组, 耗时)
+    """
+    start = time.time()
+    workers = workers or os.cpu_count() or 1
+    rows, index = read_block_index(compressed)
+    view = memoryview(compressed)
+
+    tasks = []
+    shapes = _block_shapes(original_shape, rows, len(index))
+    for (offset, length), block_shape in zip(index, shapes):
+        tasks.append((decompress_fn, bytes(view[offset:offset + length]),
+                      block_shape, dtype))
+    blocks = _map(_decompress_block, tasks, workers, executor)
+
+    decompressed = np.empty(original_shape, dtype=dtype)
+    for i, block in enumerate(blocks):
+        decompressed[i * rows:i * rows + len(block)] = block
+    return decompressed, time.time() - start
+
+
+def make_chunked_pair(compress_fn: Callable, decompress_fn: Callable,
+                      **kwargs) -> Tuple[Callable, Callable]:
+    """
+    把已有的compress_*/decompress_*函数对包装为分块并行版本
+
+    返回的函数签名与原函数一致, 可直接放入methods字典.
+    """
+    decompress_kwargs = {k: v for k, v in kwargs.items()
+                         if k in ('workers', 'executor')}
+    return (partial(compress_chunked, compress_fn=compress_fn, **kwargs),
+            partial(decompress_chunked, decompress_fn=decompress_fn,
+                    **decompress_kwargs))
+
+
+def _sample_rows(block: np.ndarray, sample_size: int) -> np.ndarray:
+    """取块中部连续的若干行作为样本"""
+    rows = _rows_per_block(block, sample_size)
+    if rows >= block.shape[0]:
+        return block
+    begin = (block.shape[0] - rows) // 2
+    return block[begin:begin + rows]
+
+
+def select_codec(sample: np.ndarray, candidates: List[Tuple[str, Callable]],
+                 min_throughput: float, exclude: tuple = ()) -> Tuple[int, List[dict]]:
+    """
+    用样本预测各候选编码器的压缩率和速度, 选出最佳编码器
+
+    在预测压缩吞吐量不低于min_throughput (MB/s) 的编码器中选压缩率最高的;
+    如果都达不到, 则选最快的. 在样本上出错的候选 (如不支持该数据类型或维数)
+    以及exclude中的候选不参与选择.
+
+    返回:
+        (选中的候选编号, 每个候选的预测值)
+    """
+    sample = np.ascontiguousarray(sample)
+    predictions = []
+    for i, (name, compress_fn) in enumerate(candidates):
+        if i in exclude:
+            predictions.append({'codec': name, 'ratio': 0.0, 'throughput': 0.0,
+                                'error': 'excluded'})
+            continue
+        start = time.perf_counter()
+        try:
+            compressed, _ = compress_fn(sample)
+        except Exception as e:
+            predictions.append({'codec': name, 'ratio': 0.0, 'throughput': 0.0,
+                                'error': str(e)})
+            continue
+        elapsed = time.perf_counter() - start
+        predictions.append({
+            'codec': name,
+            'ratio': sample.nbytes / max(len(compressed), 1),
+            'throughput': sample.nbytes / max(elapsed, 1e-9) / (1024**2),
+            'error': None,
+        })
+
+    usable = [i for i, p in enumerate(predictions) if p['error'] is None]
+    if not usable:
+        raise ValueError(f"没有可用的候选编码器: {[p['error'] for p in predictions]}")
+    eligible = [i for i in usable if predictions[i]['throughput'] >= min_throughput]
+    if eligible:
+        best = max(eligible, key=lambda i: predictions[i]['ratio'])
+    else:
+        best = max(usable, key=lambda i: predictions[i]['throughput'])
+    return best, predictions
+
+
+def _compress_block_auto(candidates: List[Tuple[str, Callable]], min_throughput: float,
+                         sample_size: int, block: np.ndarray) -> Tuple[int, bytes]:
+    block = np.ascontiguousarray(block)
+    sample = _sample_rows(block, sample_size)
+    failed = ()
+    while True:
+        best, _ = select_codec(sample, candidates, min_throughput, exclude=failed)
+        try:
+            compressed, _ = candidates[best][1](block)
+            return best, compressed
+        except Exception:
+            # 样本上可用但整块出错时换下一个候选
+            failed += (best,)
+
+
+def read_auto_index(compressed: bytes) -> Tuple[int, List[str], List[Tuple[int, int, int]]]:
+    """
+    读取自适应格式的头部
+
+    返回:
+        (每块行数, 编码器名称表, [(编码器编号, 偏移, 长度), ...])
+    """
+    magic, version, rows, n_blocks = HEADER.unpack_from(compressed, 0)
+    if magic != AUTO_MAGIC:
+        raise ValueError("不是自适应分块压缩格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的分块格式版本: {version}")
+    offset = HEADER.size
+    n_codecs = compressed[offset]
+    offset += 1
+    names = []
+    for _ in range(n_codecs):
+        length = compressed[offset]
+        names.append(bytes(compressed[offset + 1:offset + 1 + length]).decode())
+        offset += 1 + length
+
+    entries = [BLOCK_ENTRY.unpack_from(compressed, offset + i * BLOCK_ENTRY.size)
+               for i in range(n_blocks)]
+    offset += n_blocks * BLOCK_ENTRY.size
+    index = []
+    for codec, length in entries:
+        index.append((codec, offset, length))
+        offset += length
+    return rows, names, index
+
+
+def compress_chunked_auto(data: np.ndarray, candidates: Dict[str, tuple],
+                          min_throughput: float = 0.0,
+                          block_size: int = DEFAULT_BLOCK_SIZE,
+                          sample_size: int = DEFAULT_SAMPLE_SIZE,
+                          workers: int = None,
+                          executor: str = 'process') -> Tuple[bytes, float]:
+    """
+    自适应分块压缩: 每块根据样本预测独立选择编码器
+
+    参数:
+        data: 要压缩的numpy数组
+        candidates: {名称: (压缩函数, 解压函数)}, 与methods字典格式相同
+        min_throughput: 压缩吞吐量下限 (MB/s)
+        block_size: 每块的目标大小 (字节)
+        sample_size: 每块用于预测的样本大小 (字节)
+        workers: 并行数, 默认为CPU核数
+        executor: 'process' 或 'thread'
+
+    返回:
+        (压缩后的字节串, 耗时)
+    """
+    start = time.time()
+    workers = workers or os.cpu_count() or 1
+    names = list(candidates)
+    compress_fns = [(name, candidates[name][0]) for name in names]
+    rows = _rows_per_block(data, block_size)
+    blocks = [(compress_fns, min_throughput, sample_size, data[i:i + rows])
+              for i in range(0, max(data.shape[0], 1), rows)]
+    chosen = _map(_compress_block_auto, blocks, workers, executor)
+
+    parts = [HEADER.pack(AUTO_MAGIC, VERSION, rows, len(chosen)),
+             bytes([len(names)])]
+    for name in names:
+        encoded = name.encode()
+        parts.append(bytes([len(encoded)]) + encoded)
+    parts.extend(BLOCK_ENTRY.pack(codec, len(payload))
+                 for codec, payload in chosen)
+    parts.extend(payload for _, payload in chosen)
+    return b''.join(parts), time.time() - start
+
+
+def decompress_chunked_auto(compressed: bytes, original_shape: tuple, dtype,
+                            candidates: Dict[str, tuple],
+                            workers: int = None,
+                            executor: str = 'process') -> Tuple[np.ndarray, float]:
+    """
+    自适应分块解压, 按块头部记录的编码器名称查找解压函数
+
+    参数:
+        candidates: {名称: (压缩函数, 解压函数)}, 须包含压缩时用到的所有编码器
+    """
+    start = time.time()
+    workers = workers or os.cpu_count() or 1
+    rows, names, index = read_auto_index(compressed)
+    view = memoryview(compressed)
+
+    tasks = []
+    shapes = _block_shapes(original_shape, rows, len(index))
+    for (codec, offset, length), block_shape in zip(index, shapes):
+        decompress_fn = candidates[names[codec]][1]
+        tasks.append((decompress_fn, bytes(view[offset:offset + length]),
+                      block_shape, dtype))
+    blocks = _map(_decompress_block, tasks, workers, executor)
+
+    decompressed = np.empty(original_shape, dtype=dtype)
+    for i, block in enumerate(blocks):
+        decompressed[i * rows:i * rows + len(block)] = block
+    return decompressed, time.time() - start
+
+
+def make_auto_pair(candidates: Dict[str, tuple], min_throughput: float = 0.0,
+                   **kwargs) -> Tuple[Callable, Callable]:
+    """
+    构造自适应分块压缩函数对, 签名与compress_*/decompress_*一致
+    """
+    decompress_kwargs = {k: v for k, v in kwargs.items()
+                         if k in ('workers', 'executor')}
+    return (partial(compress_chunked_auto, candidates=candidates,
+                    min_throughput=min_throughput, **kwargs),
+            partial(decompress_chunked_auto, candidates=candidates,
+                    **decompress_kwargs))
+
+
+def summarize_auto_choices(compressed: bytes) -> Dict[str, int]:
+    """统计自适应压缩结果中每种编码器被选中的块数"""
+    _, names, index = read_auto_index(compressed)
+    return dict(Counter(names[codec] for codec, _, _ in index))
+
+
+def compress_many(arrays: List[np.ndarray], compress_fn: Callable,
+                  workers: int = None, executor: str = 'thread') -> List[bytes]:
+    """
+    并发压缩多个独立的数组
+
+    zlib/bz2/lzma在压缩时释放GIL, 线程池即可利用多核, 且没有进程启动和
+    序列化数组的开销.
+    """
+    workers = workers or os.cpu_count() or 1
+    return _map(_compress_block, [(compress_fn, a) for a in arrays],
+                workers, executor)
+
+
+def decompress_many(compressed: List[bytes], shapes: List[tuple], dtypes: list,
+                    decompress_fn: Callable, workers: int = None,
+                    executor: str = 'thread') -> List[np.ndarray]:
+    """并发解压多个独立的数组, compress_many的逆过程"""
+    workers = workers or os.cpu_count() or 1
+    tasks = [(decompress_fn, c, shape, dtype)
+             for c, shape, dtype in zip(compressed, shapes, dtypes)]
+    return _map(_decompress_block, tasks, workers, executor)
+
+
+def benchmark_scaling(data: np.ndarray, compress_fn: Callable,
+                      decompress_fn: Callable, max_workers: int = None,
+                      block_size: int = DEFAULT_BLOCK_SIZE,
+                      executor: str = 'process') -> Dict[int, dict]:
+    """
+    测试分块压缩吞吐量随核数(1, 2, 4, ... N)的扩展情况
+
+    返回:
+        {并行数: 统计信息}
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    counts = []
+    n = 1
+    while n < max_workers:
+        counts.append(n)
+        n *= 2
+    counts.append(max_workers)
+
+    original_size = data.nbytes
+    results = {}
+    for workers in counts:
+        compressed, compress_time = compress_chunked(
+            data, compress_fn, block_size=block_size,
+            workers=workers, executor=executor)
+        _, decompress_time = decompress_chunked(
+            compressed, data.shape, data.dtype, decompress_fn,
+            workers=workers, executor=executor)
+        results[workers] = {
+            'compressed_size': len(compressed),
+            'compress_time': compress_time,
+            'decompress_time': decompress_time,
+            # MB/s
+            'throughput_compress': original_size / max(compress_time, 1e-6) / (1024**2),
+            # MB/s
+            'throughput_decompress': original_size / max(decompress_time, 1e-6) / (1024**2),
+        }
+
+    base = results[counts[0]]
+    for info in results.values():
+        info['speedup_compress'] = base['compress_time'] / \
+            max(info['compress_time'], 1e-6)
+        info['speedup_decompress'] = base['decompress_time'] / \
+            max(info['decompress_time'], 1e-6)
+    return results
+
+
+def benchmark_executors(data: np.ndarray, compress_fn: Callable,
+                        decompress_fn: Callable, max_workers: int = None,
+                        block_size: int = DEFAULT_BLOCK_SIZE) -> Dict[str, Dict[int, dict]]:
+    """
+    分别用线程池和进程池测试核数扩展
+
+    返回:
+        {'thread': {并行数: 统计信息}, 'process': {...}}
+    """
+    return {executor: benchmark_scaling(data, compress_fn, decompress_fn,
+                                        max_workers=max_workers,
+                                        block_size=block_size, executor=executor)
+            for executor in ('thread', 'process')}
+
+
+def print_executor_comparison(name: str, results: Dict[str, Dict[int, dict]]):
+    """并排打印线程池和进程池的扩展结果"""
+    thread, process = results['thread'], results['process']
+    print(f"\n{name} 线程池 vs 进程池:")
+    print(f"{'核数':>6} {'线程压缩MB/s':>14} {'加速比':>8} {'进程压缩MB/s':>14} {'加速比':>8}"
+          f" {'线程解压MB/s':>14} {'进程解压MB/s':>14}")
+    for workers in thread:
+        t, p = thread[workers], process[workers]
+        print(f"{workers:>6} {t['throughput_compress']:>14.2f} {t['speedup_compress']:>8.2f} "
+              f"{p['throughput_compress']:>14.2f} {p['speedup_compress']:>8.2f} "
+              f"{t['throughput_decompress']:>14.2f} {p['throughput_decompress']:>14.2f}")
+
+
+def print_scaling_results(name: str, results: Dict[int, dict]):
+    """打印核数扩展测试结果"""
+    print(f"\n{name} 分块压缩核数扩展:")
+    print(f"{'核数':>6} {'压缩MB/s':>12} {'加速比':>8} {'解压MB/s':>12} {'加速比':>8}")
+    for workers, info in results.items():
+        print(f"{workers:>6} {info['throughput_compress']:>12.2f} "
+              f"{info['speedup_compress']:>8.2f} "
+              f"{info['throughput_decompress']:>12.2f} "
+              f"{info['speedup_decompress']:>8.2f}")
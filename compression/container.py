@@ -0,0 +1,290 @@
+"""
+自描述的压缩容器, 支持按切片随机读取
+
+文件格式:
+    MAGIC(4) | 版本(1) | 头部长度(I) | JSON头部 | 块索引 | 块数据...
+
+JSON头部记录形状, 数据类型, 编码器名称和块形状; 块索引按块网格的C顺序
+记录每块的(文件偏移(Q), 压缩长度(Q)). read_slice只解压与切片重叠的块,
+块数据从内存映射中读取.
+"""
+import itertools
+import json
+import mmap
+import struct
+import time
+from typing import Tuple
+
+import numpy as np
+
+from main import DECOMPRESS_INTO, get_compression_methods
+
+MAGIC = b'NPYC'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sBI')
+INDEX_ENTRY = struct.Struct('<QQ')
+
+# 默认块大小 (字节)
+DEFAULT_CHUNK_BYTES = 256 * 1024
+
+
+def default_chunks(shape: tuple, itemsize: int,
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> tuple:
+    """
+    选择块形状: 从第0维开始逐维减半, 直到每块不超过chunk_bytes
+    """
+    chunks = list(shape)
+    axis = 0
+    while int(np.prod(chunks)) * itemsize > chunk_bytes and any(c > 1 for c in chunks):
+        if chunks[axis] > 1:
+            chunks[axis] = (chunks[axis] + 1) // 2
+        axis = (axis + 1) % len(chunks)
+    return tuple(max(c, 1) for c in chunks)
+
+
+def _grid_shape(shape: tuple, chunks: tuple) -> tuple:
+    return tuple(-(-s // c) for s, c in zip(shape, chunks))
+
+
+def _chunk_region(grid_index: tuple, shape: tuple, chunks: tuple) -> tuple:
+    """块在原数组中的切片"""
+    return tuple(slice(i * c, min((i + 1) * c, s))
+                 for i, c, s in zip(grid_index, chunks, shape))
+
+
+def write_container(path: str, data: np.ndarray, codec: str = 'zlib',
+                    chunks: tuple = None) -> Tuple[int, float]:
+    """
+    把数组分块压缩写入容器文件
+
+    参数:
+        path: 输出文件路径
+        data: 要压缩的numpy数组
+        codec: get_compression_methods中的方法名称
+        chunks: 块形状, 默认由default_chunks决定
+
+    返回:
+        (文件大小, 耗时)
+    """
+    start = time.time()
+    compress_fn, _ = get_compression_methods()[codec]
+    chunks = tuple(chunks or default_chunks(data.shape, data.itemsize))
+    grid = _grid_shape(data.shape, chunks)
+
+    header = json.dumps({
+        'shape': list(data.shape),
+        'dtype': data.dtype.str,
+        'codec': codec,
+        'chunks': list(chunks),
+    }).encode()
+    n_chunks = int(np.prod(grid))
+    offset = PREAMBLE.size + len(header) + n_chunks * INDEX_ENTRY.size
+
+    with open(path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        # 先占位, 写完所有块后回填索引
+        index_pos = f.tell()
+        f.write(bytes(n_chunks * INDEX_ENTRY.size))
+
+        index = []
+        for grid_index in itertools.product(*[range(g) for g in grid]):
+            block = np.ascontiguousarray(
+                data[_chunk_region(grid_index, data.shape, chunks)])
+            compressed, _ = compress_fn(block)
+            f.write(compressed)
+            index.append(INDEX_ENTRY.pack(offset, len(compressed)))
+            offset += len(compressed)
+
+        f.seek(index_pos)
+        f.write(b''.join(index))
+    return offset, time.time() - start
+
+
+class ContainerReader:
+    """
+    只读打开容器文件, 块数据通过内存映射按需读取
+    """
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_len = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError("不是压缩容器文件")
+        if version != VERSION:
+            raise ValueError(f"不支持的容器版本: {version}")
+        header = json.loads(
+            self._mm[PREAMBLE.size:PREAMBLE.size + header_len].decode())
+
+        self.shape = tuple(header['shape'])
+        self.dtype = np.dtype(header['dtype'])
+        self.codec = header['codec']
+        self.chunks = tuple(header['chunks'])
+        self.grid = _grid_shape(self.shape, self.chunks)
+        self._decompress_fn = get_compression_methods()[self.codec][1]
+        # zlib/bz2可以直接解压到预分配的数组中
+        self._decompress_into = DECOMPRESS_INTO.get(self.codec)
+        # 块形状 -> 复用的解压缓冲区
+        self._scratch = {}
+
+        n_chunks = int(np.prod(self.grid))
+        self._index = np.frombuffer(
+            self._mm, dtype='<u8', count=2 * n_chunks,
+            offset=PREAMBLE.size + header_len).reshape(n_chunks, 2)
+
+    def close(self):
+        # 释放对内存映射的引用后才能关闭
+        self._index = None
+        self._scratch = {}
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_chunk(self, grid_index: tuple, out: np.ndarray = None) -> np.ndarray:
+        """
+        解压单个块
+
+        参数:
+            out: 可写的C连续数组, 形状与块相同; 编码器支持时直接解压到其中
+        """
+        flat = int(np.ravel_multi_index(grid_index, self.grid))
+        offset, length = (int(v) for v in self._index[flat])
+        region = _chunk_region(grid_index, self.shape, self.chunks)
+        chunk_shape = tuple(r.stop - r.start for r in region)
+        source = memoryview(self._mm)[offset:offset + length]
+        if self._decompress_into is not None:
+            if out is None:
+                out = np.empty(chunk_shape, dtype=self.dtype)
+            self._decompress_into(source, out)
+            return out
+        decompressed, _ = self._decompress_fn(bytes(source), chunk_shape, self.dtype)
+        decompressed = np.asarray(decompressed).reshape(chunk_shape)
+        if out is not None:
+            out[...] = decompressed
+            return out
+        return decompressed
+
+    def _normalize_key(self, key) -> Tuple[list, list, list]:
+        """
+        把索引规范化为每维的(起点, 终点)边界框, 边界框内的局部索引, 以及需要去掉的维度
+        """
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is None for k in key):
+            raise IndexError("不支持np.newaxis")
+        n_ellipsis = sum(k is Ellipsis for k in key)
+        if n_ellipsis > 1:
+            raise IndexError("只能有一个省略号")
+        if n_ellipsis:
+            i = key.index(Ellipsis)
+            key = key[:i] + (slice(None),) * \
+                (len(self.shape) - len(key) + 1) + key[i + 1:]
+        if len(key) > len(self.shape):
+            raise IndexError("索引维数过多")
+        key = key + (slice(None),) * (len(self.shape) - len(key))
+
+        bounds, local, drop = [], [], []
+        for axis, (k, dim) in enumerate(zip(key, self.shape)):
+            if isinstance(k, slice):
+                start, stop, step = k.indices(dim)
+                n = len(range(start, stop, step))
+                if n == 0:
+                    bounds.append((0, 0))
+                    local.append(slice(0, 0))
+                    continue
+                last = start + (n - 1) * step
+                lo, hi = min(start, last), max(start, last) + 1
+                bounds.append((lo, hi))
+                if step > 0:
+                    local.append(slice(0, hi - lo, step))
+                else:
+                    local.append(slice(start - lo, None, step))
+            else:
+                i = int(k)
+                if i < 0:
+                    i += dim
+                if not 0 <= i < dim:
+                    raise IndexError(f"索引 {k} 超出第{axis}维的范围 {dim}")
+                bounds.append((i, i + 1))
+                local.append(slice(0, 1))
+                drop.append(axis)
+        return bounds, local, drop
+
+    def __getitem__(self, key) -> np.ndarray:
+        bounds, local, drop = self._normalize_key(key)
+        box = np.empty([hi - lo for lo, hi in bounds], dtype=self.dtype)
+
+        if box.size:
+            # 与边界框重叠的块
+            ranges = [range(lo // c, (hi - 1) // c + 1)
+                      for (lo, hi), c in zip(bounds, self.chunks)]
+            for grid_index in itertools.product(*ranges):
+                region = _chunk_region(grid_index, self.shape, self.chunks)
+                src, dst = [], []
+                for r, (lo, hi) in zip(region, bounds):
+                    a, b = max(r.start, lo), min(r.stop, hi)
+                    src.append(slice(a - r.start, b - r.start))
+                    dst.append(slice(a - lo, b - lo))
+                target = box[tuple(dst)]
+                whole = all(s.stop - s.start == r.stop - r.start for s, r in zip(src, region))
+                if whole and target.flags.c_contiguous and self._decompress_into is not None:
+                    # 整块落在结果中的连续区域, 直接解压到结果里
+                    self.read_chunk(grid_index, out=target)
+                    continue
+                chunk_shape = tuple(r.stop - r.start for r in region)
+                if chunk_shape not in self._scratch:
+                    self._scratch[chunk_shape] = np.empty(chunk_shape, dtype=self.dtype)
+                chunk = self.read_chunk(grid_index, out=self._scratch[chunk_shape])
+                box[tuple(dst)] = chunk[tuple(src)]
+
+        result = box[tuple(local)]
+        return result.squeeze(axis=tuple(drop)) if drop else result
+
+    def read(self) -> np.ndarray:
+        """解压整个数组"""
+        return self[...]
+
+
+def read_slice(path: str, key) -> np.ndarray:
+    """
+    只解压与切片重叠的块, 例如 read_slice(path, np.s_[10, :100])
+    """
+    with ContainerReader(path) as reader:
+        return reader[key]
+
+
+# 示例用法
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    rows, cols = 4096, 4096
+    x = np.linspace(0, 1, cols, dtype=np.float32)
+    arr = np.sin(10 * x)[:, None] * np.cos(10 * x)[None, :]
+    arr += np.random.rand(rows, cols).astype(np.float32) * 0.01
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'data.npc')
+        size, write_time = write_container(path, arr, codec='shuffle+zlib')
+        print(f"容器大小: {size/1024**2:.2f} MB, 压缩率 {arr.nbytes / size:.2f}x, "
+              f"写入 {write_time:.3f} sec")
+
+        start = time.time()
+        full = read_slice(path, ...)
+        full_time = time.time() - start
+        assert np.array_equal(full, arr)
+
+        start = time.time()
+        row = read_slice(path, np.s_[rows // 3])
+        row_time = time.time() - start
+        assert np.array_equal(row, arr[rows // 3])
+
+        print(f"读取整个数组: {full_time:.4f} sec")
+        print(f"读取单行: {row_time:.4f} sec ({full_time / max(row_time, 1e-6):.1f}x)")
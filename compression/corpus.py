@@ -0,0 +1,233 @@
+"""
+压缩测试用的合成数据集
+
+按数据类别(平滑场, 白噪声, 稀疏场, 整数值浮点, 阶跃函数, 时间序列),
+维数, 数据类型(float16/32/64, int16)和大小(KB到GB)生成可复现的数组,
+并可在整个数据集上批量运行compare_compression_methods / compare_lossy_methods.
+
+用法:
+    python corpus.py --sizes 64KB 4MB --json corpus.json
+    python corpus.py --lossy --dtypes float32 --ndims 2
+"""
+import argparse
+import itertools
+import json
+import sys
+import zlib
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+# 大小名称 -> 字节数
+SIZES = {
+    '64KB': 64 * 1024,
+    '4MB': 4 * 1024**2,
+    '64MB': 64 * 1024**2,
+    '1GB': 1024**3,
+}
+
+DTYPES = ['float16', 'float32', 'float64', 'int16']
+NDIMS = [1, 2, 3]
+
+# 整数类型的缩放系数, 使[-1, 1]范围的数据占用足够的有效位
+INT_SCALE = 1000
+
+
+def _coords(shape: tuple) -> List[np.ndarray]:
+    """每维归一化到[0, 1]的可广播坐标"""
+    return [np.linspace(0, 1, n, dtype=np.float32).reshape(
+        [-1 if i == axis else 1 for i in range(len(shape))])
+        for axis, n in enumerate(shape)]
+
+
+def smooth_field(shape: tuple, rng: np.random.Generator) -> np.ndarray:
+    """若干低频正弦的乘积, 对应平滑的物理场"""
+    result = np.ones(shape, dtype=np.float32)
+    for c in _coords(shape):
+        freq = rng.uniform(2, 12)
+        result *= np.sin(freq * c + rng.uniform(0, np.pi))
+    return result
+
+
+def white_noise(shape: tuple, rng: np.random.Generator) -> np.ndarray:
+    """标准正态白噪声"""
+    return rng.standard_normal(shape, dtype=np.float32)
+
+
+def sparse_field(shape: tuple, rng: np.random.Generator, density: float = 0.01) -> np.ndarray:
+    """大部分为0, 约density比例的位置为随机值"""
+    result = np.zeros(shape, dtype=np.float32)
+    flat = result.reshape(-1)
+    n = max(1, int(flat.size * density))
+    flat[rng.integers(0, flat.size, n)] = rng.uniform(-1, 1, n)
+    return result
+
+
+def integer_valued(shape: tuple, rng: np.random.Generator) -> np.ndarray:
+    """取值为小整数的浮点数组"""
+    return rng.integers(0, 256, shape).astype(np.float32)
+
+
+def step_function(shape: tuple, rng: np.random.Generator, n_steps: int = 64) -> np.ndarray:
+    """按C顺序展开后的分段常数"""
+    size = int(np.prod(shape))
+    edges = np.sort(rng.integers(0, size, n_steps))
+    levels = rng.uniform(-1, 1, n_steps + 1).astype(np.float32)
+    counts = np.diff(np.concatenate([[0], edges, [size]]))
+    return np.repeat(levels, counts).reshape(shape)
+
+
+def time_series(shape: tuple, rng: np.random.Generator) -> np.ndarray:
+    """沿最后一维的随机游走 + 正弦 + 噪声, 每行一条序列"""
+    steps = rng.standard_normal(shape, dtype=np.float32) * 0.01
+    walk = np.cumsum(steps, axis=-1, dtype=np.float32)
+    t = _coords(shape)[-1]
+    return walk + 0.5 * np.sin(40 * t) + \
+        rng.standard_normal(shape, dtype=np.float32) * 0.001
+
+
+# 类别名称 -> 生成函数
+KINDS = {
+    'smooth': smooth_field,
+    'noise': white_noise,
+    'sparse': sparse_field,
+    'integer': integer_valued,
+    'steps': step_function,
+    'timeseries': time_series,
+}
+
+
+def shape_for(nbytes: int, itemsize: int, ndim: int) -> tuple:
+    """给定总字节数和维数, 选择尽量接近正方体的形状"""
+    n = max(1, nbytes // itemsize)
+    side = max(1, int(round(n ** (1 / ndim))))
+    shape = [side] * (ndim - 1)
+    shape.append(max(1, n // int(np.prod(shape))))
+    return tuple(shape)
+
+
+def _cast(data: np.ndarray, dtype: str) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'i':
+        info = np.iinfo(dtype)
+        # 已经是整数值的数据 (如integer类别) 不再缩放, 否则大部分会饱和
+        scaled = data if np.all(data == np.round(data)) else np.round(data * INT_SCALE)
+        return np.clip(scaled, info.min, info.max).astype(dtype)
+    return data.astype(dtype, copy=False)
+
+
+def case_name(kind: str, dtype: str, shape: tuple) -> str:
+    return f"{kind}_{dtype}_{'x'.join(map(str, shape))}"
+
+
+def generate(kind: str, shape: tuple, dtype: str = 'float32', seed: int = 0) -> np.ndarray:
+    """
+    生成单个数组
+
+    相同的(kind, shape, dtype, seed)总是得到相同的数组.
+    """
+    name = case_name(kind, dtype, shape)
+    rng = np.random.default_rng([seed, zlib.crc32(name.encode())])
+    return _cast(KINDS[kind](shape, rng), dtype)
+
+
+def iter_corpus(kinds: List[str] = None, dtypes: List[str] = None,
+                ndims: List[int] = None, sizes: List[str] = None,
+                seed: int = 0) -> Iterator[Tuple[str, np.ndarray]]:
+    """
+    依次生成数据集中的每个数组
+
+    逐个生成而不是一次性返回列表, 以便GB级的数组不必同时驻留内存.
+
+    返回:
+        (名称, 数组) 的迭代器
+    """
+    kinds = kinds or list(KINDS)
+    dtypes = dtypes or DTYPES
+    ndims = ndims or NDIMS
+    sizes = sizes or ['64KB', '4MB']
+    for size, ndim, dtype, kind in itertools.product(sizes, ndims, dtypes, kinds):
+        shape = shape_for(SIZES[size], np.dtype(dtype).itemsize, ndim)
+        yield case_name(kind, dtype, shape), generate(kind, shape, dtype, seed)
+
+
+def run_corpus(compare_fn: Callable, corpus: Iterator[Tuple[str, np.ndarray]],
+               accept: Callable = None) -> Dict[str, Dict[str, dict]]:
+    """
+    在整个数据集上批量运行比较函数
+
+    参数:
+        compare_fn: compare_compression_methods 或 compare_lossy_methods
+        corpus: iter_corpus的输出
+        accept: 可选的过滤函数, 返回False的数组被跳过
+
+    返回:
+        {数组名称: compare_fn的结果}
+    """
+    results = {}
+    for name, data in corpus:
+        if accept is not None and not accept(data):
+            continue
+        print(f"{name} ({data.nbytes/1024**2:.2f} MB)...")
+        results[name] = compare_fn(data)
+    return results
+
+
+def print_corpus_summary(results: Dict[str, Dict[str, dict]], key: str = 'compression_ratio'):
+    """打印 方法 x 数组 的汇总表"""
+    methods = sorted({m for r in results.values() for m in r})
+    width = max([len(m) for m in methods] + [6])
+    print(f"\n{key}:")
+    print(f"{'case':<32} " + ' '.join(f"{m:>{width}}" for m in methods))
+    for name, r in results.items():
+        cells = []
+        for m in methods:
+            info = r.get(m)
+            cells.append(f"{info[key]:>{width}.2f}" if info and info['available']
+                         else f"{'-':>{width}}")
+        print(f"{name:<32} " + ' '.join(cells))
+
+
+def _to_jsonable(value):
+    if isinstance(value, dict):
+        return {k: _to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="在合成数据集上批量比较压缩方法")
+    parser.add_argument('--kinds', nargs='*', choices=list(KINDS))
+    parser.add_argument('--dtypes', nargs='*', choices=DTYPES)
+    parser.add_argument('--ndims', nargs='*', type=int, choices=NDIMS)
+    parser.add_argument('--sizes', nargs='*', choices=list(SIZES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--lossy', action='store_true',
+                        help="运行compare_lossy_methods (只用二维浮点数组)")
+    parser.add_argument('--json', help="结果写入JSON文件")
+    args = parser.parse_args(argv)
+
+    if args.lossy:
+        # 有损方法只比较二维浮点数组
+        args.ndims = args.ndims or [2]
+        args.dtypes = args.dtypes or [d for d in DTYPES if d.startswith('float')]
+    corpus = iter_corpus(args.kinds, args.dtypes, args.ndims, args.sizes,
+                         seed=args.seed)
+    if args.lossy:
+        from more import compare_lossy_methods
+        results = run_corpus(compare_lossy_methods, corpus,
+                             accept=lambda a: a.ndim == 2 and a.dtype.kind == 'f')
+    else:
+        from main import compare_compression_methods
+        results = run_corpus(compare_compression_methods, corpus)
+
+    print_corpus_summary(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(_to_jsonable(results), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Gorilla风格的XOR浮点压缩, 用于一维传感器时间序列
+
+每个值与前一个值的比特模式做XOR; 相邻值越接近, XOR结果的前导零和尾随零越多.
+原始Gorilla逐值决定是否沿用上一个有效位窗口, 这一步天然是串行的.
+这里改为每block_size个值共用一个窗口 (块内XOR的最高位和最低有效位),
+使编码和解码都能用NumPy整体向量化完成.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 元素字节数(1) | 元素个数(Q) | 块大小(I)
+    | 每块窗口最低位(uint8 * 块数) | 每块窗口宽度(uint8 * 块数)
+    | XOR非零标志位图 (1比特/值)
+    | 按窗口宽度从小到大排列的各段有效位 (同一宽度的值在元素顺序下连续打包)
+"""
+import struct
+import time
+from typing import Tuple
+
+import numpy as np
+
+MAGIC = b'GRLA'
+VERSION = 1
+HEADER = struct.Struct('<4sBBQI')
+
+DEFAULT_BLOCK_SIZE = 64
+
+# 打包有效位时每次处理的值个数 (8的倍数, 使各片的比特数按字节对齐)
+PACK_SLICE = 65536
+
+
+def _bit_length(x: np.ndarray) -> np.ndarray:
+    """uint64数组每个元素的比特长度, 0的比特长度为0"""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    # 32位以内的整数可以被float64精确表示, frexp的指数即比特长度
+    return np.where(hi > 0, 32 + np.frexp(hi)[1], np.frexp(lo)[1])
+
+
+def _trailing_zeros(x: np.ndarray) -> np.ndarray:
+    """uint64数组每个元素的尾随零个数, 0记为64"""
+    lowest = x & (~x + np.uint64(1))
+    return np.where(x > 0, _bit_length(lowest) - 1, 64)
+
+
+def _pack_values(values: np.ndarray, width: int) -> bytes:
+    """把每个值的低width位按顺序连续打包"""
+    shifts = np.arange(width - 1, -1, -1, dtype=np.uint64)
+    parts = []
+    for i in range(0, len(values), PACK_SLICE):
+        bits = (values[i:i + PACK_SLICE, None] >> shifts) & np.uint64(1)
+        parts.append(np.packbits(bits.astype(np.uint8).reshape(-1)).tobytes())
+    return b''.join(parts)
+
+
+def _unpack_values(packed: memoryview, count: int, width: int) -> np.ndarray:
+    """_pack_values的逆过程"""
+    values = np.empty(count, dtype=np.uint64)
+    raw = np.frombuffer(packed, dtype=np.uint8)
+    for i in range(0, count, PACK_SLICE):
+        m = min(PACK_SLICE, count - i)
+        start = i * width // 8
+        bits = np.unpackbits(raw[start:start + (m * width + 7) // 8],
+                             count=m * width).reshape(m, width)
+        v = np.zeros(m, dtype=np.uint64)
+        for k in range(width):
+            v = (v << np.uint64(1)) | bits[:, k]
+        values[i:i + m] = v
+    return values
+
+
+def compress_gorilla(data: np.ndarray, block_size: int = DEFAULT_BLOCK_SIZE) -> Tuple[bytes, float]:
+    """使用Gorilla风格的XOR编码压缩 (按C顺序展开为一维)"""
+    start = time.time()
+    if data.dtype.itemsize not in (4, 8) or data.dtype.kind != 'f':
+        raise ValueError(f"gorilla只支持float32/float64, 不支持 {data.dtype}")
+    n = data.size
+    bits = np.ascontiguousarray(data).reshape(-1).view(
+        f'<u{data.dtype.itemsize}').astype(np.uint64)
+
+    # 与前一个值异或, 第一个值与0异或即原值
+    xor = np.empty(-(-n // block_size) * block_size, dtype=np.uint64)
+    xor[:n] = bits
+    xor[1:n] ^= bits[:-1]
+    xor[n:] = 0
+    blocks = xor.reshape(-1, block_size)
+
+    # 每块共用的有效位窗口 [lo, hi)
+    flags = blocks != 0
+    hi = _bit_length(blocks).max(axis=1)
+    lo = np.where(hi > 0, _trailing_zeros(blocks).min(axis=1), 0)
+    width = (hi - lo).astype(np.uint8)
+    shifted = blocks >> lo.astype(np.uint64)[:, None]
+
+    parts = [HEADER.pack(MAGIC, VERSION, data.dtype.itemsize, n, block_size),
+             lo.astype(np.uint8).tobytes(), width.tobytes(),
+             np.packbits(flags.reshape(-1)[:n]).tobytes()]
+    for w in np.unique(width[flags.any(axis=1)]):
+        selected = flags & (width == w)[:, None]
+        parts.append(_pack_values(shifted[selected], int(w)))
+    return b''.join(parts), time.time() - start
+
+
+def decompress_gorilla(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
+    """Gorilla风格的XOR编码解压"""
+    start = time.time()
+    magic, version, itemsize, n, block_size = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是gorilla格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的gorilla格式版本: {version}")
+    view = memoryview(compressed)
+    n_blocks = -(-n // block_size)
+
+    offset = HEADER.size
+    lo = np.frombuffer(view, np.uint8, n_blocks, offset).astype(np.uint64)
+    offset += n_blocks
+    width = np.frombuffer(view, np.uint8, n_blocks, offset)
+    offset += n_blocks
+    flags = np.zeros(n_blocks * block_size, dtype=bool)
+    flags[:n] = np.unpackbits(np.frombuffer(view, np.uint8, (n + 7) // 8, offset),
+                              count=n).astype(bool)
+    offset += (n + 7) // 8
+    flags = flags.reshape(n_blocks, block_size)
+
+    xor = np.zeros((n_blocks, block_size), dtype=np.uint64)
+    for w in np.unique(width[flags.any(axis=1)]):
+        selected = flags & (width == w)[:, None]
+        count = int(selected.sum())
+        size = (count * int(w) + 7) // 8
+        values = _unpack_values(view[offset:offset + size], count, int(w))
+        offset += size
+        xor[selected] = values << np.broadcast_to(lo[:, None], xor.shape)[selected]
+
+    # 前缀异或还原比特模式
+    bits = np.bitwise_xor.accumulate(xor.reshape(-1)[:n])
+    uint_dtype = np.dtype(f'<u{itemsize}')
+    decompressed = bits.astype(uint_dtype).view(dtype).reshape(original_shape)
+    return decompressed, time.time() - start
+
+
+# 示例用法
+if __name__ == "__main__":
+    from main import compare_compression_methods, print_comparison_results
+
+    # 100 Hz采样, 缓慢变化并量化到传感器分辨率的一维序列
+    print("创建测试数据...")
+    t = np.arange(0, 3600, 0.01)
+    series = 20 + 5 * np.sin(2 * np.pi * t / 600) + \
+        np.cumsum(np.random.normal(0, 0.01, t.shape))
+    series = np.round(series, 2)
+
+    for dtype in (np.float64, np.float32):
+        arr = series.astype(dtype)
+        print(f"\n{np.dtype(dtype).name}: {arr.size} 个值 ({arr.nbytes/1024**2:.2f} MB)")
+        results = compare_compression_methods(arr)
+        # 只显示与gorilla对比的几种方法
+        print_comparison_results({k: v for k, v in results.items()
+                                  if k in ('gorilla', 'zlib', 'bz2', 'fpzip')})
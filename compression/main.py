@@ -1,38 +1,92 @@
 import zlib
 import bz2
+import lzma
 import numpy as np
 import time
 import sys
 import io
+import importlib.util
 from typing import Dict, Tuple
 
-# 检查可选依赖是否可用
-try:
-    import fpzip
-    FPZIP_AVAILABLE = True
-except ImportError:
-    FPZIP_AVAILABLE = False
+from chunked import (make_chunked_pair, make_auto_pair, benchmark_executors,
+                     print_executor_comparison, summarize_auto_choices)
+from filters import make_filtered_pair
+from gorilla import compress_gorilla, decompress_gorilla
+from prepass import make_prepass_pair
+from sequence import make_sequence_pair
+from registry import build_methods, register_codec
 
-try:
-    import zfpy
-    ZFPY_AVAILABLE = True
-except ImportError:
-    ZFPY_AVAILABLE = False
+# 检查可选依赖是否可用 (只查找模块, 不导入, 第一次使用时才导入)
+FPZIP_AVAILABLE = importlib.util.find_spec('fpzip') is not None
+ZFPY_AVAILABLE = importlib.util.find_spec('zfpy') is not None
+HDF5_AVAILABLE = importlib.util.find_spec('h5py') is not None
 
-try:
-    import h5py
-    HDF5_AVAILABLE = True
-except ImportError:
-    HDF5_AVAILABLE = False
+# 自适应模式默认的压缩吞吐量下限 (MB/s)
+AUTO_MIN_THROUGHPUT = 10.0
 
+# 自适应模式的候选编码器
+AUTO_CANDIDATES = ['zlib', 'bz2', 'shuffle+zlib',
+                   'delta+shuffle+zlib', 'shuffle+bz2', 'fpzip']
 
-def compress_zlib(data: np.ndarray) -> Tuple[bytes, float]:
-    """使用zlib压缩"""
+# 零拷贝解压和流式验证每次处理的字节数
+STREAM_CHUNK = 1024**2
+
+
+def _as_buffer(data) -> memoryview:
+    """转为一维字节视图, C连续的数组不会被复制"""
+    if isinstance(data, np.ndarray):
+        return memoryview(np.ascontiguousarray(data).reshape(-1).view(np.uint8))
+    return memoryview(data).cast('B')
+
+
+def _output_view(out: np.ndarray) -> memoryview:
+    """预分配输出数组的可写字节视图"""
+    if not out.flags.c_contiguous or not out.flags.writeable:
+        raise ValueError("输出数组必须是可写的C连续数组")
+    return memoryview(out.reshape(-1).view(np.uint8))
+
+
+def compress_zlib_buffer(buffer, level: int = 9) -> Tuple[bytes, float]:
+    """直接从支持缓冲区协议的对象(memoryview, ndarray等)做zlib压缩"""
     start = time.time()
-    compressed = zlib.compress(data.tobytes(), level=9)
+    compressed = zlib.compress(_as_buffer(buffer), level=level)
     return compressed, time.time() - start
 
 
+def decompress_zlib_into(compressed, out: np.ndarray) -> Tuple[np.ndarray, float]:
+    """zlib解压到调用方预分配的数组中, 不产生完整大小的中间字节串"""
+    start = time.time()
+    view = _output_view(out)
+    source = _as_buffer(compressed)
+    decompressor = zlib.decompressobj()
+    pos = 0
+    for i in range(0, len(source), STREAM_CHUNK):
+        chunk = source[i:i + STREAM_CHUNK]
+        while chunk:
+            piece = decompressor.decompress(
+                chunk, min(STREAM_CHUNK, len(view) - pos) or 1)
+            view[pos:pos + len(piece)] = piece
+            pos += len(piece)
+            chunk = decompressor.unconsumed_tail
+            if pos == len(view) and chunk:
+                raise ValueError("解压数据超出输出数组大小")
+    if pos != len(view):
+        raise ValueError(f"解压数据大小不匹配: {pos} != {len(view)}")
+    return out, time.time() - start
+
+
+def decompress_zlib_preallocated(compressed, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
+    """先分配输出数组, 再用decompress_zlib_into流式解压进去"""
+    start = time.time()
+    out, _ = decompress_zlib_into(compressed, np.empty(original_shape, dtype=dtype))
+    return out, time.time() - start
+
+
+def compress_zlib(data: np.ndarray, level: int = 9) -> Tuple[bytes, float]:
+    """使用zlib压缩"""
+    return compress_zlib_buffer(data, level=level)
+
+
 def decompress_zlib(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
     """使用zlib解压"""
     start = time.time()
@@ -41,13 +95,49 @@ def decompress_zlib(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np
     return decompressed, time.time() - start
 
 
-def compress_bz2(data: np.ndarray) -> Tuple[bytes, float]:
-    """使用bz2压缩"""
+def compress_bz2_buffer(buffer, level: int = 9) -> Tuple[bytes, float]:
+    """直接从支持缓冲区协议的对象(memoryview, ndarray等)做bz2压缩"""
     start = time.time()
-    compressed = bz2.compress(data.tobytes(), compresslevel=9)
+    compressed = bz2.compress(_as_buffer(buffer), compresslevel=level)
     return compressed, time.time() - start
 
 
+def decompress_bz2_into(compressed, out: np.ndarray) -> Tuple[np.ndarray, float]:
+    """bz2解压到调用方预分配的数组中, 不产生完整大小的中间字节串"""
+    start = time.time()
+    view = _output_view(out)
+    source = _as_buffer(compressed)
+    decompressor = bz2.BZ2Decompressor()
+    pos = 0
+    for i in range(0, len(source), STREAM_CHUNK):
+        piece = decompressor.decompress(source[i:i + STREAM_CHUNK],
+                                        min(STREAM_CHUNK, len(view) - pos))
+        view[pos:pos + len(piece)] = piece
+        pos += len(piece)
+        while not decompressor.needs_input and not decompressor.eof:
+            if pos == len(view):
+                raise ValueError("解压数据超出输出数组大小")
+            piece = decompressor.decompress(
+                b'', min(STREAM_CHUNK, len(view) - pos))
+            view[pos:pos + len(piece)] = piece
+            pos += len(piece)
+    if pos != len(view):
+        raise ValueError(f"解压数据大小不匹配: {pos} != {len(view)}")
+    return out, time.time() - start
+
+
+def decompress_bz2_preallocated(compressed, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
+    """先分配输出数组, 再用decompress_bz2_into流式解压进去"""
+    start = time.time()
+    out, _ = decompress_bz2_into(compressed, np.empty(original_shape, dtype=dtype))
+    return out, time.time() - start
+
+
+def compress_bz2(data: np.ndarray, level: int = 9) -> Tuple[bytes, float]:
+    """使用bz2压缩"""
+    return compress_bz2_buffer(data, level=level)
+
+
 def decompress_bz2(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
     """使用bz2解压"""
     start = time.time()
@@ -56,10 +146,26 @@ def decompress_bz2(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np.
     return decompressed, time.time() - start
 
 
+def compress_lzma(data: np.ndarray, level: int = 6) -> Tuple[bytes, float]:
+    """使用lzma压缩, level为预设等级0-9"""
+    start = time.time()
+    compressed = lzma.compress(_as_buffer(data), preset=level)
+    return compressed, time.time() - start
+
+
+def decompress_lzma(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np.ndarray, float]:
+    """使用lzma解压"""
+    start = time.time()
+    decompressed = np.frombuffer(lzma.decompress(
+        compressed), dtype=dtype).reshape(original_shape)
+    return decompressed, time.time() - start
+
+
 def compress_fpzip(data: np.ndarray) -> Tuple[bytes, float]:
     """使用fpzip压缩"""
     if not FPZIP_AVAILABLE:
         raise ImportError("fpzip not available")
+    import fpzip
     start = time.time()
     # fpzip.compress返回的是字节串，不需要额外处理
     compressed = fpzip.compress(data, order='C')
@@ -70,6 +176,7 @@ def decompress_fpzip(compressed: bytes, original_shape: tuple, dtype) -> Tuple[n
     """使用fpzip解压"""
     if not FPZIP_AVAILABLE:
         raise ImportError("fpzip not available")
+    import fpzip
     start = time.time()
     # 直接从压缩数据解压，不需要指定形状和类型
     decompressed = fpzip.decompress(compressed)
@@ -85,6 +192,7 @@ def compress_zfpy(data: np.ndarray) -> Tuple[bytes, float]:
     """使用zfp压缩"""
     if not ZFPY_AVAILABLE:
         raise ImportError("zfpy not available")
+    import zfpy
     start = time.time()
     compressed = zfpy.compress_numpy(data)
     return compressed, time.time() - start
@@ -94,21 +202,23 @@ def decompress_zfpy(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np
     """使用zfp解压"""
     if not ZFPY_AVAILABLE:
         raise ImportError("zfpy not available")
+    import zfpy
     start = time.time()
     decompressed = zfpy.decompress_numpy(compressed)
     return decompressed, time.time() - start
 
 
-def compress_hdf5(data: np.ndarray) -> Tuple[bytes, float]:
+def compress_hdf5(data: np.ndarray, level: int = 9) -> Tuple[bytes, float]:
     """使用HDF5/gzip压缩"""
     if not HDF5_AVAILABLE:
         raise ImportError("h5py not available")
+    import h5py
     start = time.time()
     # 使用BytesIO作为内存文件
     with io.BytesIO() as f:
         with h5py.File(f, 'w') as h5f:
             h5f.create_dataset('data', data=data,
-                               compression='gzip', compression_opts=9)
+                               compression='gzip', compression_opts=level)
         compressed = f.getvalue()
     return compressed, time.time() - start
 
@@ -117,6 +227,7 @@ def decompress_hdf5(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np
     """使用HDF5/gzip解压"""
     if not HDF5_AVAILABLE:
         raise ImportError("h5py not available")
+    import h5py
     start = time.time()
     with io.BytesIO(compressed) as f:
         with h5py.File(f, 'r') as h5f:
@@ -124,6 +235,104 @@ def decompress_hdf5(compressed: bytes, original_shape: tuple, dtype) -> Tuple[np
     return decompressed, time.time() - start
 
 
+def max_abs_difference(original: np.ndarray, decompressed: np.ndarray,
+                       chunk_size: int = STREAM_CHUNK) -> float:
+    """
+    逐块比较两个数组, 返回最大绝对误差
+
+    每次只比较约chunk_size字节的行, 不产生完整大小的临时数组.
+    """
+    if original.shape != decompressed.shape:
+        raise ValueError(
+            f"形状不匹配: 原始 {original.shape}, 解压后 {decompressed.shape}")
+    if original.ndim == 0:
+        original, decompressed = original.reshape(1), decompressed.reshape(1)
+
+    row_nbytes = original.itemsize * int(np.prod(original.shape[1:]))
+    rows = max(1, chunk_size // max(row_nbytes, 1))
+    max_diff = 0.0
+    for i in range(0, original.shape[0], rows):
+        a, b = original[i:i + rows], decompressed[i:i + rows]
+        if np.array_equal(a, b):
+            continue
+        diff = np.max(np.abs(a.astype(np.float64) - b.astype(np.float64)))
+        max_diff = max(max_diff, float(diff))
+    return max_diff
+
+
+# 注册无损编码器
+register_codec('zlib', lambda: (compress_zlib, decompress_zlib))
+register_codec('bz2', lambda: (compress_bz2, decompress_bz2))
+register_codec('lzma', lambda: (compress_lzma, decompress_lzma))
+# 与zlib/bz2格式相同, 解压到预分配的数组中, 用于对比峰值内存
+register_codec('zlib_into', lambda: (compress_zlib, decompress_zlib_preallocated))
+register_codec('bz2_into', lambda: (compress_bz2, decompress_bz2_preallocated))
+# 编码器名称 -> 解压到预分配数组的函数, 容器按块读取时使用
+DECOMPRESS_INTO = {
+    'zlib': decompress_zlib_into,
+    'zlib_into': decompress_zlib_into,
+    'bz2': decompress_bz2_into,
+    'bz2_into': decompress_bz2_into,
+}
+# 分块并行版本
+register_codec('chunked_zlib', lambda: make_chunked_pair(
+    compress_zlib, decompress_zlib))
+register_codec('chunked_bz2', lambda: make_chunked_pair(
+    compress_bz2, decompress_bz2))
+# zlib/bz2释放GIL, 线程池版本没有进程启动和序列化开销
+register_codec('threaded_zlib', lambda: make_chunked_pair(
+    compress_zlib, decompress_zlib, executor='thread'))
+register_codec('threaded_bz2', lambda: make_chunked_pair(
+    compress_bz2, decompress_bz2, executor='thread'))
+# 预过滤 + 字节编码器
+for _pipeline in ('shuffle', 'bitshuffle', 'delta', 'delta+shuffle'):
+    register_codec(f'{_pipeline}+zlib', lambda p=_pipeline: make_filtered_pair(
+        p, compress_zlib, decompress_zlib))
+    register_codec(f'{_pipeline}+bz2', lambda p=_pipeline: make_filtered_pair(
+        p, compress_bz2, decompress_bz2))
+# 整数值降位 / 常数段RLE + 字节编码器
+register_codec('prepass+zlib', lambda: make_prepass_pair(compress_zlib, decompress_zlib))
+register_codec('prepass+bz2', lambda: make_prepass_pair(compress_bz2, decompress_bz2))
+# 帧序列 (沿第0维堆叠) 的帧间差分
+for _mode in ('xor', 'sub'):
+    register_codec(f'temporal_{_mode}+shuffle+zlib', lambda m=_mode: make_sequence_pair(
+        *make_filtered_pair('shuffle', compress_zlib, decompress_zlib), mode=m),
+        ndims=(3, 4))
+# 一维时间序列的相邻值XOR编码
+register_codec('gorilla', lambda: (compress_gorilla, decompress_gorilla),
+               dtypes=('float32', 'float64'), ndims=(1,))
+register_codec('fpzip', lambda: (compress_fpzip, decompress_fpzip),
+               dtypes=('float32', 'float64'), ndims=(1, 2, 3, 4),
+               requires=('fpzip',))
+register_codec('zfp', lambda: (compress_zfpy, decompress_zfpy),
+               dtypes=('float32', 'float64', 'int32', 'int64'),
+               ndims=(1, 2, 3, 4), requires=('zfpy',))
+register_codec('hdf5_gzip', lambda: (compress_hdf5, decompress_hdf5),
+               requires=('h5py',))
+
+
+def get_compression_methods(auto_min_throughput: float = AUTO_MIN_THROUGHPUT,
+                            data: np.ndarray = None) -> Dict[str, tuple]:
+    """
+    所有可用的无损压缩方法, 由编码器注册表生成
+
+    参数:
+        auto_min_throughput: 自适应模式的压缩吞吐量下限 (MB/s)
+        data: 给出时只返回支持该数组数据类型和维数的方法
+
+    返回:
+        {名称: (压缩函数, 解压函数)}
+    """
+    methods = build_methods(lossless=True, data=data)
+
+    # 每块独立选择编码器
+    candidates = {k: methods[k] for k in AUTO_CANDIDATES if k in methods}
+    methods['auto'] = make_auto_pair(
+        candidates, min_throughput=auto_min_throughput)
+
+    return methods
+
+
 def compare_compression_methods(data: np.ndarray, verify: bool = True) -> Dict[str, dict]:
     """
     比较不同压缩方法的性能
@@ -136,17 +345,7 @@ def compare_compression_methods(data: np.ndarray, verify: bool = True) -> Dict[s
         包含每种方法统计信息的字典
     """
     original_size = data.nbytes
-    methods = {
-        'zlib': (compress_zlib, decompress_zlib),
-        'bz2': (compress_bz2, decompress_bz2),
-    }
-
-    if FPZIP_AVAILABLE:
-        methods['fpzip'] = (compress_fpzip, decompress_fpzip)
-    if ZFPY_AVAILABLE:
-        methods['zfp'] = (compress_zfpy, decompress_zfpy)
-    if HDF5_AVAILABLE:
-        methods['hdf5_gzip'] = (compress_hdf5, decompress_hdf5)
+    methods = get_compression_methods(data=data)
 
     results = {}
 
@@ -163,11 +362,10 @@ def compare_compression_methods(data: np.ndarray, verify: bool = True) -> Dict[s
 
             # 验证
             if verify:
-                if not np.array_equal(data, decompressed_data):
-                    max_diff = np.max(np.abs(data - decompressed_data))
-                    if max_diff > 1e-6:  # 允许微小的浮点误差
-                        raise ValueError(
-                            f"{name} decompression failed - data mismatch (max diff: {max_diff})")
+                max_diff = max_abs_difference(data, decompressed_data)
+                if max_diff > 1e-6:  # 允许微小的浮点误差
+                    raise ValueError(
+                        f"{name} decompression failed - data mismatch (max diff: {max_diff})")
 
             # 计算压缩率
             compression_ratio = original_size / compressed_size
@@ -247,3 +445,19 @@ if __name__ == "__main__":
 
     # 打印结果
     print_comparison_results(results)
+
+    # 分块压缩的核数扩展测试 (线程池 vs 进程池)
+    big = np.random.rand(2048, 2048).astype(np.float32)
+    big[::10, ::10] = 1.0
+    print(f"\n扩展测试数组大小: {(big.nbytes)/1024**2:.2f} MB")
+    for name, (compress_fn, decompress_fn) in {
+        'zlib': (compress_zlib, decompress_zlib),
+        'bz2': (compress_bz2, decompress_bz2),
+    }.items():
+        print_executor_comparison(
+            name, benchmark_executors(big, compress_fn, decompress_fn))
+
+    # 自适应模式每块的编码器选择
+    compress_auto, _ = get_compression_methods()['auto']
+    print(
+        f"\n自适应模式各编码器选中的块数: {summarize_auto_choices(compress_auto(big)[0])}")
@@ -0,0 +1,121 @@
+"""
+分块计算有损压缩的质量指标
+
+calculate_metrics原来一次性生成与数组同样大小的diff和diff**2临时数组,
+并对整个数组调用scikit-image的SSIM. 这里改为:
+    - 最大/平均绝对误差, MSE和PSNR: 按块扫描一遍, 临时数组只有一块大小,
+      累加用float64
+    - SSIM: 按行切成带边缘重叠的条带, 在进程池中计算每条带的局部SSIM图,
+      只保留整幅图像计算时同样会保留的内部区域, 最后合并求平均
+结果与整幅计算一致 (差别只在浮点舍入).
+"""
+import os
+import time
+from typing import Tuple
+
+import numpy as np
+
+from chunked import _map
+
+# 误差扫描每块的元素个数
+DEFAULT_CHUNK_SIZE = 4 * 1024**2
+# SSIM每条带的目标字节数 (按float64计算)
+DEFAULT_SSIM_BLOCK_BYTES = 32 * 1024**2
+# 与skimage.metrics.structural_similarity的默认窗口相同
+SSIM_WIN_SIZE = 7
+
+
+def error_metrics(original: np.ndarray, decompressed: np.ndarray,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    一遍扫描计算最大/平均绝对误差, MSE和PSNR
+
+    差值的数据类型与 original - decompressed 相同.
+    """
+    a = np.asarray(original).reshape(-1)
+    b = np.asarray(decompressed).reshape(-1)
+    if a.size != b.size:
+        raise ValueError(f"元素个数不一致: {a.size} != {b.size}")
+
+    max_error = 0
+    abs_sum = 0.0
+    sq_sum = 0.0
+    peak = None
+    for i in range(0, a.size, chunk_size):
+        x = a[i:i + chunk_size]
+        diff = np.abs(x - b[i:i + chunk_size])
+        max_error = np.maximum(max_error, diff.max())
+        abs_sum += float(diff.sum(dtype=np.float64))
+        sq_sum += float(np.dot(diff.astype(np.float64), diff.astype(np.float64)))
+        peak = x.max() if peak is None else max(peak, x.max())
+
+    mse = sq_sum / a.size
+    return {
+        'max_error': max_error,
+        'mean_error': abs_sum / a.size,
+        'mse': mse,
+        'psnr': 10 * np.log10(float(peak)**2 / mse) if mse > 0 else float('inf'),
+    }
+
+
+def _ssim_strip(img1: np.ndarray, img2: np.ndarray, data_range: float,
+                keep: slice) -> Tuple[float, int]:
+    """条带的局部SSIM图中keep行 (去掉左右边缘) 的和与像素数"""
+    from skimage.metrics import structural_similarity
+    _, ssim_map = structural_similarity(img1, img2, data_range=data_range,
+                                        win_size=SSIM_WIN_SIZE, full=True)
+    pad = (SSIM_WIN_SIZE - 1) // 2
+    kept = ssim_map[keep, pad:ssim_map.shape[1] - pad]
+    return float(kept.sum(dtype=np.float64)), kept.size
+
+
+def tiled_ssim(img1: np.ndarray, img2: np.ndarray,
+               block_bytes: int = DEFAULT_SSIM_BLOCK_BYTES,
+               workers: int = None, executor: str = 'process') -> float:
+    """
+    按行条带并行计算SSIM, 与skimage对整幅图像计算的结果一致
+
+    每条带上下各多取窗口半径行, 使保留的行的局部窗口完全落在条带内;
+    整幅图像本来就去掉的边缘行列在这里同样去掉.
+    """
+    rows, cols = img1.shape
+    pad = (SSIM_WIN_SIZE - 1) // 2
+    # 与整幅计算相同, 保持输入的数据类型以得到相同的舍入
+    data_range = img1.max() - img1.min()
+    if rows <= 2 * pad or cols <= 2 * pad:
+        raise ValueError(f"图像太小, 无法计算 {SSIM_WIN_SIZE}x{SSIM_WIN_SIZE} 窗口的SSIM")
+    workers = workers or os.cpu_count() or 1
+    strip_rows = max(1, block_bytes // max(1, cols * 8))
+
+    args = []
+    for lo in range(pad, rows - pad, strip_rows):
+        hi = min(lo + strip_rows, rows - pad)
+        # 边缘条带用到图像边界时, 反射延拓与整幅计算相同
+        top, bottom = max(0, lo - pad), min(rows, hi + pad)
+        args.append((np.ascontiguousarray(img1[top:bottom]),
+                     np.ascontiguousarray(img2[top:bottom]),
+                     data_range, slice(lo - top, hi - top)))
+    parts = _map(_ssim_strip, args, workers, executor)
+
+    total = sum(s for s, _ in parts)
+    count = sum(n for _, n in parts)
+    return total / count
+
+
+def compute_metrics(original: np.ndarray, decompressed: np.ndarray,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    ssim: bool = True, workers: int = None) -> dict:
+    """
+    计算质量指标, 与calculate_metrics的键相同, 另含'mse'和'metrics_time'
+
+    参数:
+        ssim: 是否计算SSIM (只对二维数组)
+        workers: SSIM的并行进程数, 默认为CPU核数
+    """
+    start = time.time()
+    decompressed = np.asarray(decompressed).reshape(original.shape)
+    metrics = error_metrics(original, decompressed, chunk_size=chunk_size)
+    metrics['ssim'] = tiled_ssim(original, decompressed, workers=workers) \
+        if ssim and original.ndim == 2 else float('nan')
+    metrics['metrics_time'] = time.time() - start
+    return metrics
@@ -1,56 +1,25 @@
 from typing import Dict, Tuple
-import sys
-import io
-from sklearn.decomposition import PCA
-import pywt
+import importlib.util
 import time
-import zfpy
 import numpy as np
 
-# 检查可选依赖是否可用
-try:
-    import sz
-    SZ_AVAILABLE = True
-except ImportError:
-    SZ_AVAILABLE = False
-
-try:
-    import tensorflow as tf
-    import tensorflow_compression as tfc
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
-
-
-class FloatCompressor:
-    """TensorFlow神经网络压缩器"""
-
-    def __init__(self):
-        self.model = self._build_model()
-
-    def _build_model(self):
-        model = tf.keras.Sequential([
-            tf.keras.layers.Reshape((-1, 1)),
-            tfc.SignalConv1D(32, (3,), corr=True, strides_down=2, padding="same_zeros",
-                             use_bias=True, activation=tf.nn.relu),
-            tfc.SignalConv1D(64, (3,), corr=True, strides_down=2, padding="same_zeros",
-                             use_bias=True, activation=tf.nn.relu),
-            tfc.SignalConv1D(128, (3,), corr=True, strides_down=2, padding="same_zeros",
-                             use_bias=True, activation=None),
-            tfc.NoisyDeepFactorized(bits=8),
-            tfc.SignalConv1D(64, (3,), transp=True, strides_up=2, padding="same_zeros",
-                             use_bias=True, activation=tf.nn.relu),
-            tfc.SignalConv1D(32, (3,), transp=True, strides_up=2, padding="same_zeros",
-                             use_bias=True, activation=tf.nn.relu),
-            tfc.SignalConv1D(1, (3,), transp=True, strides_up=2, padding="same_zeros",
-                             use_bias=True, activation=None),
-            tf.keras.layers.Reshape((-1,))
-        ])
-        return model
+from registry import build_methods, get_codec, register_codec
+from pca import compress_pca, decompress_pca
+from wavelet import compress_wavelet, decompress_wavelet
+from metrics import compute_metrics
+from neural import compress_tf, decompress_tf, warm_up
+from lorenzo import compress_lorenzo, decompress_lorenzo
+from bitgroom import compress_bitgroom, decompress_bitgroom
+from progressive import compress_progressive, decompress_progressive
+
+# 检查可选依赖是否可用 (只查找模块, 不导入; pywt, zfpy, TensorFlow
+# 都在第一次使用时才导入, TensorFlow见neural.py)
+SZ_AVAILABLE = importlib.util.find_spec('sz') is not None
 
 
 def compress_zfp(data: np.ndarray, tolerance: float = 1e-3) -> Tuple[bytes, float]:
     """使用ZFP有损压缩"""
+    import zfpy
     start = time.time()
     compressed = zfpy.compress_numpy(data, tolerance=tolerance)
     return compressed, time.time() - start
@@ -58,6 +27,7 @@ def compress_zfp(data: np.ndarray, tolerance: float = 1e-3) -> Tuple[bytes, floa
 
 def decompress_zfp(compressed: bytes) -> Tuple[np.ndarray, float]:
     """使用ZFP解压"""
+    import zfpy
     start = time.time()
     decompressed = zfpy.decompress_numpy(compressed)
     return decompressed, time.time() - start
@@ -67,6 +37,7 @@ def compress_sz(data: np.ndarray, rel_bound: float = 1e-4) -> Tuple[bytes, float
     """使用SZ有损压缩"""
     if not SZ_AVAILABLE:
         raise ImportError("sz not available")
+    import sz
     start = time.time()
     compressed = sz.compress(data, mode='REL', rel_bound=rel_bound)
     return compressed, time.time() - start
@@ -76,94 +47,75 @@ def decompress_sz(compressed: bytes) -> Tuple[np.ndarray, float]:
     """使用SZ解压"""
     if not SZ_AVAILABLE:
         raise ImportError("sz not available")
+    import sz
     start = time.time()
     decompressed = sz.decompress(compressed)
     return decompressed, time.time() - start
 
 
-def compress_wavelet(data: np.ndarray, threshold: float = 0.1) -> Tuple[object, float]:
-    """使用小波变换有损压缩"""
-    start = time.time()
-    coeffs = pywt.wavedec2(data, 'bior6.8', level=4)
-    # 存储为字节流
-    with io.BytesIO() as f:
-        np.savez(f, *coeffs)
-        compressed = f.getvalue()
-    return compressed, time.time() - start
-
-
-def decompress_wavelet(compressed: bytes) -> Tuple[np.ndarray, float]:
-    """小波解压"""
-    start = time.time()
-    with io.BytesIO(compressed) as f:
-        coeffs = list(np.load(f, allow_pickle=True).values())
-    # Convert the coeffs into CORRECT type.
-    for j in range(1, len(coeffs)):
-        coeffs[j] = tuple(coeffs[j])
-    decompressed = pywt.waverec2(coeffs, 'bior6.8')
-    return decompressed, time.time() - start
-
-
-def compress_pca(data: np.ndarray, variance: float = 0.95) -> Tuple[object, float]:
-    """使用PCA有损压缩"""
-    start = time.time()
-    pca = PCA(n_components=variance)
-    flattened = data.reshape(data.shape[0], -1)
-    compressed = pca.fit_transform(flattened)
-    # 存储为字节流
-    with io.BytesIO() as f:
-        np.savez(f, components=pca.components_,
-                 mean=pca.mean_, compressed=compressed)
-        compressed_data = f.getvalue()
-    return (compressed_data, pca), time.time() - start
-
-
-def decompress_pca(compressed: tuple) -> Tuple[np.ndarray, float]:
-    """PCA解压"""
-    compressed_data, pca = compressed
-    start = time.time()
-    with io.BytesIO(compressed_data) as f:
-        data = np.load(f)
-        decompressed = pca.inverse_transform(data['compressed'])
-    # return decompressed.reshape(pca.mean_.shape), time.time() - start
-    return decompressed.reshape((pca.mean_.shape[0], pca.mean_.shape[0])), time.time() - start
-
-
-def compress_tf(data: np.ndarray) -> Tuple[object, float]:
-    """使用TensorFlow神经网络压缩"""
-    if not TF_AVAILABLE:
-        raise ImportError("tensorflow_compression not available")
-    start = time.time()
-    compressor = FloatCompressor()
-    compressed = compressor.model.predict(data[np.newaxis, ..., np.newaxis])
-    return compressed, time.time() - start
-
-
-def decompress_tf(compressed: np.ndarray) -> Tuple[np.ndarray, float]:
-    """TensorFlow解压"""
-    if not TF_AVAILABLE:
-        raise ImportError("tensorflow_compression not available")
-    start = time.time()
-    decompressed = compressed.reshape(compressed.shape[1:-1])
-    return decompressed, time.time() - start
-
-
 def calculate_metrics(original: np.ndarray, decompressed: np.ndarray) -> dict:
-    """计算质量指标"""
-    diff = original - decompressed
-    return {
-        'max_error': np.max(np.abs(diff)),
-        'mean_error': np.mean(np.abs(diff)),
-        'psnr': 10 * np.log10(np.max(original)**2 / np.mean(diff**2)),
-        'ssim': compute_ssim(original, decompressed) if original.ndim == 2 else float('nan')
-    }
+    """计算质量指标 (分块扫描误差, 按条带并行计算SSIM, 见metrics.py)"""
+    metrics = compute_metrics(original, decompressed)
+    return {k: metrics[k] for k in ('max_error', 'mean_error', 'psnr', 'ssim')}
+
+
+# 注册有损编码器, 第三项为compare_lossy_methods使用的默认参数
+register_codec('zfp', lambda: (compress_zfp, decompress_zfp), lossless=False,
+               dtypes=('float32', 'float64'), ndims=(1, 2, 3, 4),
+               requires=('zfpy',), params={'tolerance': 1e-3},
+               tuning={'param': 'tolerance', 'low': 1e-7, 'high': 0.5,
+                       'log': True, 'relative': True})
+# 不依赖sz模块的Lorenzo预测量化, 误差界的定义与sz的REL模式相同
+register_codec('lorenzo', lambda: (compress_lorenzo, decompress_lorenzo), lossless=False,
+               dtypes=('float16', 'float32', 'float64'), ndims=(1, 2, 3, 4),
+               params={'rel_bound': 1e-4},
+               tuning={'param': 'rel_bound', 'low': 1e-7, 'high': 0.5, 'log': True})
+register_codec('bitgroom', lambda: (compress_bitgroom, decompress_bitgroom), lossless=False,
+               dtypes=('float16', 'float32', 'float64'), ndims=(1, 2, 3, 4),
+               params={'digits': 3},
+               # low为各类型无损所需的十进制位数 (ceil(digits * log2(10)) >= 尾数位数)
+               tuning={'param': 'digits', 'low': {'float16': 4, 'float32': 7, 'float64': 16},
+                       'high': 1, 'log': False, 'integer': True})
+# 只截断不压缩, 压缩吞吐量即截断本身的吞吐量
+register_codec('bitgroom_raw', lambda: (compress_bitgroom, decompress_bitgroom), lossless=False,
+               dtypes=('float16', 'float32', 'float64'), ndims=(1, 2, 3, 4),
+               params={'digits': 3, 'backend': 'raw'})
+register_codec('sz', lambda: (compress_sz, decompress_sz), lossless=False,
+               dtypes=('float32', 'float64'), requires=('sz',),
+               params={'rel_bound': 1e-4},
+               tuning={'param': 'rel_bound', 'low': 1e-7, 'high': 0.5, 'log': True})
+register_codec('wavelet', lambda: (compress_wavelet, decompress_wavelet),
+               lossless=False, dtypes=('float16', 'float32', 'float64'), ndims=(2,),
+               requires=('pywt',),
+               params={'threshold': 0.05},
+               tuning={'param': 'threshold', 'low': 1e-6, 'high': 0.5,
+                       'log': True, 'relative': True})
+register_codec('progressive', lambda: (compress_progressive, decompress_progressive),
+               lossless=False, dtypes=('float16', 'float32', 'float64'), ndims=(2,),
+               requires=('pywt',),
+               params={'threshold': 0.05},
+               tuning={'param': 'threshold', 'low': 1e-6, 'high': 0.5,
+                       'log': True, 'relative': True})
+register_codec('pca', lambda: (compress_pca, decompress_pca), lossless=False,
+               dtypes=('float16', 'float32', 'float64'), ndims=(2, 3, 4),
+               params={'variance': 0.95},
+               tuning={'param': 'variance', 'low': 0.99999, 'high': 0.5, 'log': False})
+register_codec('tf_nn', lambda: (compress_tf, decompress_tf), lossless=False,
+               parallel_safe=False, warmup=warm_up,
+               requires=('tensorflow', 'tensorflow_compression'))
+
+
+def get_lossy_methods(data: np.ndarray = None) -> Dict[str, tuple]:
+    """
+    所有可用的有损压缩方法, 由编码器注册表生成
 
+    参数:
+        data: 给出时只返回支持该数组数据类型和维数的方法
 
-def compute_ssim(img1, img2):
-    """计算SSIM (结构相似性)"""
-    from skimage.metrics import structural_similarity
-    data_range = img1.max() - img1.min()
-    return structural_similarity(img1, img2, data_range=data_range)
+    返回:
+        {名称: (压缩函数, 解压函数, 默认参数)}
+    """
+    return build_methods(lossless=False, data=data)
 
 
 def compare_lossy_methods(data: np.ndarray) -> Dict[str, dict]:
@@ -177,27 +129,19 @@ def compare_lossy_methods(data: np.ndarray) -> Dict[str, dict]:
         包含每种方法统计信息的字典
     """
     original_size = data.nbytes
-    methods = {
-        'zfp': (compress_zfp, decompress_zfp, {'tolerance': 1e-3}),
-    }
-
-    if SZ_AVAILABLE:
-        methods['sz'] = (compress_sz, decompress_sz, {'rel_bound': 1e-4})
-
-    methods['wavelet'] = (
-        compress_wavelet, decompress_wavelet, {'threshold': 0.05})
-    methods['pca'] = (compress_pca, decompress_pca, {'variance': 0.95})
-
-    if TF_AVAILABLE:
-        methods['tf_nn'] = (compress_tf, decompress_tf, {})
+    methods = get_lossy_methods(data)
 
     results = {}
 
     for name, (compress_fn, decompress_fn, params) in methods.items():
         try:
+            # 模型加载/训练等准备工作不计入压缩时间
+            warmup = get_codec(name, lossless=False).warmup
+            extra = warmup(**params) if warmup else {}
+
             # 压缩
             compressed_data, compress_time = compress_fn(data, **params)
-            compressed_size = sys.getsizeof(compressed_data)
+            compressed_size = len(compressed_data)
 
             # 解压
             decompressed_data, decompress_time = decompress_fn(compressed_data)
@@ -221,7 +165,8 @@ def compare_lossy_methods(data: np.ndarray) -> Dict[str, dict]:
                 'psnr': metrics['psnr'],
                 'ssim': metrics['ssim'] if 'ssim' in metrics else float('nan'),
                 'available': True,
-                'error': None
+                'error': None,
+                **extra,
             }
 
         except Exception as e:
@@ -263,6 +208,9 @@ def print_comparison_results(results: Dict[str, dict]):
         print(f"  PSNR: {info['psnr']:.2f} dB")
         if not np.isnan(info['ssim']):
             print(f"  SSIM: {info['ssim']:.4f}")
+        if 'model_trained' in info:
+            state = '新训练' if info['model_trained'] else '已缓存'
+            print(f"  模型: {state}, 准备时间 {info['warmup_time']:.2f} sec (不计入压缩时间)")
         print("-" * 80)
 
     # 打印不可用的方法
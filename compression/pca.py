@@ -0,0 +1,178 @@
+"""
+自包含的分块PCA有损编码器
+
+把数组看作 行 x 其余维展开 的矩阵, 用随机化SVD拟合主成分:
+对每个行块累加 B^T (B Ω) 得到列空间的随机草图, 做若干次幂迭代后在
+草图张成的小子空间里精确求解. 每次只读入一个行块, 内存占用与行数无关,
+因此np.memmap打开的GB级矩阵也可以流式处理.
+
+均值, 量化后的主成分和量化后的得分全部写入字节流, 解压不依赖拟合时的对象.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 元素字节数(1) | 量化位数(1) | 维数(1) | 主成分数(I)
+    | 形状(Q * 维数) | zlib压缩的:
+        均值(float32 * 列数) | 主成分缩放(float32 * k) | 主成分(int16 * k * 列数)
+        | 得分缩放(float32 * k) | 得分(int16 * 行数 * k)
+"""
+import struct
+import time
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+MAGIC = b'PCAQ'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBI')
+
+# 每个行块最多占用的字节数 (按float64计算)
+DEFAULT_BLOCK_BYTES = 64 * 1024**2
+DEFAULT_MAX_COMPONENTS = 256
+# 随机草图比主成分数多出的列数
+OVERSAMPLE = 10
+DEFAULT_POWER_ITER = 2
+DEFAULT_BITS = 12
+
+
+def _row_blocks(n_rows: int, n_cols: int, block_bytes: int):
+    rows = max(1, block_bytes // max(1, n_cols * 8))
+    for lo in range(0, n_rows, rows):
+        yield lo, min(lo + rows, n_rows)
+
+
+def _quantize(x: np.ndarray, bits: int) -> Tuple[np.ndarray, np.ndarray]:
+    """按列对称线性量化为int16, 返回(量化值, 每列缩放)"""
+    levels = 2**(bits - 1) - 1
+    scale = np.max(np.abs(x), axis=0) / levels
+    scale[scale == 0] = 1
+    return np.rint(x / scale).astype(np.int16), scale.astype(np.float32)
+
+
+def fit_components(matrix: np.ndarray, n_components, max_components: int = DEFAULT_MAX_COMPONENTS,
+                   n_iter: int = DEFAULT_POWER_ITER, block_bytes: int = DEFAULT_BLOCK_BYTES,
+                   seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    按行块流式拟合主成分 (随机化SVD)
+
+    参数:
+        matrix: 行 x 列 的矩阵, 可以是np.memmap
+        n_components: 小于1的浮点数表示保留的方差比例, 否则为主成分个数
+        max_components: 主成分个数上限, 即随机草图的秩
+        n_iter: 幂迭代次数, 每次多扫描一遍数据
+
+    返回:
+        (均值, 主成分 (列数 x k))
+    """
+    n_rows, n_cols = matrix.shape
+    blocks = list(_row_blocks(n_rows, n_cols, block_bytes))
+
+    mean = np.zeros(n_cols)
+    for lo, hi in blocks:
+        mean += matrix[lo:hi].sum(axis=0, dtype=np.float64)
+    mean /= n_rows
+
+    def gram_times(q):
+        # 中心化矩阵的 X^T X q, 逐块累加
+        result = np.zeros_like(q)
+        for lo, hi in blocks:
+            block = matrix[lo:hi] - mean
+            result += block.T @ (block @ q)
+        return result
+
+    rank = min(n_rows, n_cols, max_components + OVERSAMPLE)
+    rng = np.random.default_rng(seed)
+    q, _ = np.linalg.qr(gram_times(rng.standard_normal((n_cols, rank))))
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(gram_times(q))
+
+    # 在子空间内精确求解, 同一遍扫描中累加总方差
+    small = np.zeros((rank, rank))
+    total = 0.0
+    for lo, hi in blocks:
+        block = matrix[lo:hi] - mean
+        projected = block @ q
+        small += projected.T @ projected
+        total += float(np.sum(block**2))
+    eigvals, eigvecs = np.linalg.eigh(small)
+    order = np.argsort(eigvals)[::-1]
+    eigvals = np.clip(eigvals[order], 0, None)
+    components = q @ eigvecs[:, order]
+
+    if isinstance(n_components, float) and n_components < 1:
+        explained = np.cumsum(eigvals) / total if total > 0 else np.ones(rank)
+        k = int(np.searchsorted(explained, n_components) + 1)
+    else:
+        k = int(n_components)
+    k = max(1, min(k, max_components, rank))
+    return mean, components[:, :k]
+
+
+def compress_pca(data: np.ndarray, variance: float = 0.95,
+                 max_components: int = DEFAULT_MAX_COMPONENTS, bits: int = DEFAULT_BITS,
+                 block_bytes: int = DEFAULT_BLOCK_BYTES) -> Tuple[bytes, float]:
+    """
+    使用PCA有损压缩
+
+    参数:
+        data: 要压缩的数组, 按 第0维 x 其余维 展开为矩阵
+        variance: 保留的方差比例, 或大于等于1时为主成分个数
+        max_components: 主成分个数上限
+        bits: 主成分和得分的量化位数 (2到16)
+    """
+    start = time.time()
+    if not 2 <= bits <= 16:
+        raise ValueError(f"量化位数必须在2到16之间: {bits}")
+    matrix = data.reshape(data.shape[0], -1)
+    n_rows, n_cols = matrix.shape
+    mean, components = fit_components(matrix, variance, max_components=max_components,
+                                      block_bytes=block_bytes)
+    mean = mean.astype(np.float32)
+
+    # 得分用量化后的主成分计算, 抵消一部分主成分的量化误差
+    components_q, components_scale = _quantize(components, bits)
+    components = components_q * components_scale.astype(np.float64)
+    scores = np.empty((n_rows, components.shape[1]), dtype=np.float32)
+    for lo, hi in _row_blocks(n_rows, n_cols, block_bytes):
+        scores[lo:hi] = (matrix[lo:hi] - mean) @ components
+    scores_q, scores_scale = _quantize(scores, bits)
+
+    payload = b''.join([mean.tobytes(), components_scale.tobytes(),
+                        components_q.T.tobytes(), scores_scale.tobytes(),
+                        scores_q.tobytes()])
+    header = HEADER.pack(MAGIC, VERSION, data.dtype.itemsize, bits,
+                         data.ndim, components.shape[1])
+    shape = struct.pack(f'<{data.ndim}Q', *data.shape)
+    return b''.join([header, shape, zlib.compress(payload, 6)]), time.time() - start
+
+
+def decompress_pca(compressed: bytes, block_bytes: int = DEFAULT_BLOCK_BYTES) -> Tuple[np.ndarray, float]:
+    """PCA解压"""
+    start = time.time()
+    magic, version, itemsize, bits, ndim, k = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是PCA格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的PCA格式版本: {version}")
+    shape = struct.unpack_from(f'<{ndim}Q', compressed, HEADER.size)
+    n_rows = shape[0]
+    n_cols = int(np.prod(shape[1:]))
+    payload = zlib.decompress(memoryview(compressed)[HEADER.size + 8 * ndim:])
+
+    offset = 0
+
+    def take(dtype, count):
+        nonlocal offset
+        arr = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+        offset += arr.nbytes
+        return arr
+
+    mean = take(np.float32, n_cols)
+    components_scale = take(np.float32, k).astype(np.float64)
+    components = take(np.int16, k * n_cols).reshape(k, n_cols) * components_scale[:, None]
+    scores_scale = take(np.float32, k)
+    scores = take(np.int16, n_rows * k).reshape(n_rows, k)
+
+    decompressed = np.empty((n_rows, n_cols), dtype=f'<f{itemsize}')
+    for lo, hi in _row_blocks(n_rows, n_cols, block_bytes):
+        decompressed[lo:hi] = (scores[lo:hi] * scores_scale) @ components + mean
+    return decompressed.reshape(shape), time.time() - start
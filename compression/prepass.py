@@ -0,0 +1,197 @@
+"""
+字节编码器之前的数值分析预处理
+
+很多"浮点"数组实际只存小整数或长段常数. 先分析数据:
+    - 常数段: 按C顺序展开后相邻值比特相同的段足够长时, 做游程编码 (RLE),
+      只保存每段的值和长度
+    - 整数值和窄取值范围: 所有值都是整数 (不含NaN/inf/-0.0) 时, 减去最小值后
+      转为能容纳取值范围的最小无符号整数类型
+只在严格无损时才变换, 所做的变换记录在头部, 解压时按相反顺序还原.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 变换标志(1) | 值的字节数(1) | 游程长度的字节数(1)
+    | 偏移量(q) | 段数(Q) | 游程长度压缩后的长度(Q)
+    | 游程长度 (RLE时) | 值
+"""
+import struct
+import time
+from functools import partial
+from typing import Callable, Tuple
+
+import numpy as np
+
+MAGIC = b'PREP'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBqQQ')
+
+# 变换标志位
+RLE = 1
+DOWNCAST = 2
+
+# 段数不超过元素数的这个比例时才做RLE
+RLE_MAX_RUN_FRACTION = 0.25
+# 整数检测先检查的前缀长度, 不满足时不再扫描整个数组
+INTEGER_PROBE = 4096
+
+
+def _uint_dtype(dtype) -> np.dtype:
+    """与dtype等宽的无符号整数类型"""
+    return np.dtype(f'<u{np.dtype(dtype).itemsize}')
+
+
+def _smallest_uint(max_value: int) -> np.dtype:
+    """能容纳[0, max_value]的最小无符号整数类型"""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError(f"取值范围过大: {max_value}")
+
+
+def _is_integer_valued(flat: np.ndarray) -> bool:
+    """是否所有值都是可以无损转为int64的整数"""
+    if flat.dtype.kind in 'iub':
+        return True
+    if flat.dtype.kind != 'f':
+        return False
+
+    def check(x):
+        # -0.0转为整数会丢掉符号位
+        return bool(np.all(np.isfinite(x)) and np.all(x == np.rint(x))
+                    and not np.any(np.signbit(x) & (x == 0))
+                    and np.all(np.abs(x) <= np.float64(2**53)))
+    return check(flat[:INTEGER_PROBE]) and check(flat)
+
+
+def _runs(bits: np.ndarray) -> np.ndarray:
+    """每个常数段的起始下标"""
+    return np.flatnonzero(np.concatenate([[True], bits[1:] != bits[:-1]]))
+
+
+def analyze(data: np.ndarray) -> dict:
+    """
+    分析数组能做哪些无损变换
+
+    返回:
+        {'runs': 常数段数, 'rle': 是否做RLE, 'integer': 是否全为整数值,
+         'min'/'max': 整数值时的取值范围, 'downcast': 转换后的类型名或None}
+    """
+    flat = np.ascontiguousarray(data).reshape(-1)
+    bits = flat.view(_uint_dtype(flat.dtype))
+    runs = len(_runs(bits)) if flat.size else 0
+    rle = 0 < runs <= flat.size * RLE_MAX_RUN_FRACTION
+
+    info = {'runs': runs, 'rle': rle, 'integer': False,
+            'min': None, 'max': None, 'downcast': None}
+    if flat.size and _is_integer_valued(flat):
+        lo, hi = int(flat.min()), int(flat.max())
+        narrow = _smallest_uint(hi - lo)
+        info.update(integer=True, min=lo, max=hi)
+        if narrow.itemsize < flat.dtype.itemsize:
+            info['downcast'] = narrow.name
+    return info
+
+
+def compress_prepass(data: np.ndarray, compress_fn: Callable) -> Tuple[bytes, float]:
+    """
+    先做无损的RLE/整数转换再用字节编码器压缩
+
+    参数:
+        data: 要压缩的numpy数组
+        compress_fn: 字节编码器, 如compress_zlib
+
+    返回:
+        (压缩后的字节串, 耗时)
+    """
+    start = time.time()
+    info = analyze(data)
+    values = np.ascontiguousarray(data).reshape(-1)
+    flags = 0
+    lengths_blob = b''
+    lengths_itemsize = 0
+    n_runs = values.size
+
+    if info['rle']:
+        flags |= RLE
+        starts = _runs(values.view(_uint_dtype(values.dtype)))
+        lengths = np.diff(np.append(starts, values.size))
+        lengths = lengths.astype(_smallest_uint(int(lengths.max())))
+        lengths_itemsize = lengths.dtype.itemsize
+        lengths_blob, _ = compress_fn(lengths)
+        values = values[starts]
+        n_runs = len(starts)
+
+    offset = 0
+    if info['downcast']:
+        flags |= DOWNCAST
+        # int64的模运算差, 超过int64范围的uint64最小值按补码保存
+        offset = info['min'] - 2**64 if info['min'] >= 2**63 else info['min']
+        values = (values.astype(np.int64) - offset).astype(info['downcast'])
+
+    values_blob, _ = compress_fn(values)
+    header = HEADER.pack(MAGIC, VERSION, flags, values.dtype.itemsize,
+                         lengths_itemsize, offset, n_runs, len(lengths_blob))
+    return b''.join([header, lengths_blob, values_blob]), time.time() - start
+
+
+def decompress_prepass(compressed: bytes, original_shape: tuple, dtype,
+                       decompress_fn: Callable) -> Tuple[np.ndarray, float]:
+    """compress_prepass的逆过程"""
+    start = time.time()
+    (magic, version, flags, values_itemsize, lengths_itemsize,
+     offset, n_runs, lengths_size) = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是预处理格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的预处理格式版本: {version}")
+    dtype = np.dtype(dtype)
+    view = memoryview(compressed)
+    values_start = HEADER.size + lengths_size
+
+    values_dtype = np.dtype(f'<u{values_itemsize}') if flags & DOWNCAST else dtype
+    values, _ = decompress_fn(bytes(view[values_start:]), (n_runs,), values_dtype)
+    values = np.asarray(values).reshape(-1)
+    if flags & DOWNCAST:
+        values = (values.astype(np.int64) + offset).astype(dtype)
+
+    if flags & RLE:
+        lengths, _ = decompress_fn(bytes(view[HEADER.size:values_start]), (n_runs,),
+                                   np.dtype(f'<u{lengths_itemsize}'))
+        # 按比特重复, 保留NaN的载荷和-0.0
+        bits = np.repeat(values.view(_uint_dtype(dtype)), np.asarray(lengths).reshape(-1))
+        values = bits.view(dtype)
+
+    return values.reshape(original_shape), time.time() - start
+
+
+def make_prepass_pair(compress_fn: Callable, decompress_fn: Callable) -> Tuple[Callable, Callable]:
+    """
+    把已有的compress_*/decompress_*函数对包装为带预处理的版本
+    """
+    return (partial(compress_prepass, compress_fn=compress_fn),
+            partial(decompress_prepass, decompress_fn=decompress_fn))
+
+
+# 示例用法
+if __name__ == "__main__":
+    from main import compress_zlib, decompress_zlib
+
+    rng = np.random.default_rng(0)
+    mask = np.zeros((1000, 1000), dtype=np.float32)
+    mask[200:400, 300:700] = 1.0
+    cases = {
+        '小整数': rng.integers(0, 200, (1000, 1000)).astype(np.float32),
+        '常数段': mask,
+        '窄范围整数': rng.integers(10000, 10500, (1000, 1000)).astype(np.float64),
+        '随机浮点': rng.random((1000, 1000), dtype=np.float32),
+    }
+
+    compress_fn, decompress_fn = make_prepass_pair(compress_zlib, decompress_zlib)
+    for name, arr in cases.items():
+        info = analyze(arr)
+        plain, plain_time = compress_zlib(arr)
+        compressed, compress_time = compress_fn(arr)
+        decompressed, _ = decompress_fn(compressed, arr.shape, arr.dtype)
+        assert np.array_equal(decompressed.view(np.uint8), arr.view(np.uint8))
+        print(f"{name}: RLE={info['rle']}, 转换为={info['downcast']}")
+        print(f"  zlib: {arr.nbytes / len(plain):.2f}x, {plain_time:.3f} sec")
+        print(f"  预处理+zlib: {arr.nbytes / len(compressed):.2f}x, {compress_time:.3f} sec")
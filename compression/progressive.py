@@ -0,0 +1,257 @@
+"""
+渐进式多分辨率小波编码器 (快速预览)
+
+对整个二维数组做一次pywt.wavedec2 (周期延拓), 阈值和量化方式与wavelet.py相同,
+但按分辨率从低到高存放:
+    段0: 最粗一层的近似系数cA
+    段k: 第k层 (从粗到细) 的细节系数cH, cV, cD
+只读取开头的段0..k就能重建出约为原尺寸 1/2**(层数-k) 的预览图,
+后面的字节到达时逐层细化, 最后一段读完即得到完整分辨率.
+浏览大数组时缩略图只需要读取和逆变换很小的一部分数据.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 元素字节数(1) | 分解层数(1) | 阈值方式(1)
+    | 行数(Q) | 列数(Q) | 阈值(d) | 量化步长(d) | 小波名称长度(B) | 小波名称
+    | 每段 (系数行数(I) | 系数列数(I) | 压缩长度(Q)) * (层数 + 1) | 段数据...
+段数据:
+    整数字节数(1) | zlib(byte-shuffle后的量化系数, 细节段依次为cH, cV, cD)
+"""
+import io
+import os
+import struct
+import time
+import zlib
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from chunked import _map
+from filters import byte_shuffle, byte_unshuffle
+from wavelet import DEFAULT_LEVEL, DEFAULT_WAVELET, MODES, ZLIB_LEVEL, _smallest_int
+
+MAGIC = b'PWVL'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBQQdd')
+SEGMENT = struct.Struct('<IIQ')
+
+# 流式解码时每次读取的字节数
+DEFAULT_READ_SIZE = 64 * 1024
+
+
+def compress_segment(bands: Tuple[np.ndarray, ...], threshold: float, step: float,
+                     mode: str) -> bytes:
+    """阈值, 量化并压缩一段 (cA, 或同一层的cH, cV, cD)"""
+    array = np.stack(bands)
+    magnitude = np.abs(array)
+    if mode == 'soft':
+        array = np.sign(array) * np.maximum(magnitude - threshold, 0)
+    else:
+        array = np.where(magnitude < threshold, 0, array)
+    q = np.rint(array / step)
+    dtype = _smallest_int(q)
+    return bytes([dtype.itemsize]) + zlib.compress(byte_shuffle(q.astype(dtype)), ZLIB_LEVEL)
+
+
+def decompress_segment(payload: bytes, band_shape: tuple, n_bands: int,
+                       step: float) -> List[np.ndarray]:
+    """解压一段, 返回各子带的系数"""
+    int_dtype = np.dtype(f'<i{payload[0]}')
+    q = byte_unshuffle(np.frombuffer(zlib.decompress(payload[1:]), dtype=np.uint8),
+                       (n_bands, *band_shape), int_dtype)
+    return list(q * step)
+
+
+def compress_progressive(data: np.ndarray, threshold: float = 0.05, step: float = None,
+                         mode: str = 'hard', wavelet: str = DEFAULT_WAVELET,
+                         level: int = DEFAULT_LEVEL, workers: int = None,
+                         executor: str = 'thread') -> Tuple[bytes, float]:
+    """
+    渐进式小波压缩
+
+    参数:
+        data: 要压缩的二维数组
+        threshold: 系数阈值 (与数据同单位), 绝对值小于它的系数置0
+        step: 量化步长, 默认与threshold相同
+        mode: 'hard' 硬阈值, 'soft' 软阈值
+        level: 分解层数, 也就是预览的级数, 超过数组允许的最大层数时取最大层数
+        workers: 各段并行压缩的线程数, 默认为CPU核数
+
+    返回:
+        (压缩后的字节串, 耗时)
+    """
+    import pywt
+    start = time.time()
+    if data.ndim != 2:
+        raise ValueError(f"渐进式小波编码器只支持二维数组, 得到 {data.ndim} 维")
+    if mode not in MODES:
+        raise ValueError(f"未知的阈值方式: {mode}, 可选 {MODES}")
+    if threshold <= 0 and not step:
+        raise ValueError("threshold和step不能都为0")
+    step = step or threshold
+    workers = workers or os.cpu_count() or 1
+    level = min(level, pywt.dwt_max_level(min(data.shape), pywt.Wavelet(wavelet).dec_len))
+
+    coeffs = pywt.wavedec2(data.astype(np.float64), wavelet, mode='periodization', level=level)
+    segments = [(coeffs[0],)] + [tuple(detail) for detail in coeffs[1:]]
+    args = [(bands, threshold, step, mode) for bands in segments]
+    payloads = _map(compress_segment, args, workers, executor)
+
+    name = wavelet.encode()
+    header = HEADER.pack(MAGIC, VERSION, data.dtype.itemsize, level, MODES.index(mode),
+                         *data.shape, threshold, step)
+    index = b''.join(SEGMENT.pack(*bands[0].shape, len(p))
+                     for bands, p in zip(segments, payloads))
+    return b''.join([header, bytes([len(name)]), name, index, *payloads]), time.time() - start
+
+
+def header_size(prefix: bytes) -> int:
+    """头部和段索引的总字节数, prefix还不够判断时返回None"""
+    if len(prefix) < HEADER.size + 1:
+        return None
+    level = prefix[6]
+    name_len = prefix[HEADER.size]
+    return HEADER.size + 1 + name_len + SEGMENT.size * (level + 1)
+
+
+def read_progressive_header(compressed: bytes) -> dict:
+    """读取头部和段索引, 只需要数据开头的header_size字节"""
+    (magic, version, itemsize, level, mode,
+     rows, cols, threshold, step) = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是渐进式小波格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的渐进式小波格式版本: {version}")
+    offset = HEADER.size
+    name_len = compressed[offset]
+    wavelet = bytes(compressed[offset + 1:offset + 1 + name_len]).decode()
+    offset += 1 + name_len
+
+    entries = [SEGMENT.unpack_from(compressed, offset + SEGMENT.size * k)
+               for k in range(level + 1)]
+    offset += SEGMENT.size * (level + 1)
+    index = []
+    for band_rows, band_cols, length in entries:
+        index.append(((band_rows, band_cols), offset, length))
+        offset += length
+    return {
+        'shape': (rows, cols),
+        'dtype': np.dtype(f'<f{itemsize}'),
+        'wavelet': wavelet,
+        'level': level,
+        'mode': MODES[mode],
+        'threshold': threshold,
+        'step': step,
+        # [(系数形状, 偏移, 长度), ...], 从粗到细
+        'index': index,
+    }
+
+
+def prefix_size(info: dict, k: int) -> int:
+    """解码预览级别k需要读取的开头字节数"""
+    _, offset, length = info['index'][k]
+    return offset + length
+
+
+def _reconstruct(info: dict, coeffs: list) -> np.ndarray:
+    """用已解码的前若干段重建预览图, 幅值缩放到与原数据相同"""
+    import pywt
+    k = len(coeffs) - 1
+    image = coeffs[0] if k == 0 else \
+        pywt.waverec2(coeffs, info['wavelet'], mode='periodization')
+    # 奇数尺寸时逆变换会多出一行/列, 截到下一层近似系数 (或原数组) 的尺寸
+    target = info['index'][k + 1][0] if k < info['level'] else info['shape']
+    # 周期延拓的二维变换每一层把近似系数放大2倍
+    image = image[:target[0], :target[1]] / 2.0**(info['level'] - k)
+    return image.astype(info['dtype'])
+
+
+def decode_level(compressed: bytes, k: int = 0) -> Tuple[np.ndarray, float]:
+    """
+    只用开头的字节解码预览
+
+    参数:
+        compressed: 完整的压缩数据, 或至少包含开头prefix_size(info, k)字节
+        k: 预览级别, 0为最粗, 分解层数为完整分辨率
+
+    返回:
+        (约为原尺寸 1/2**(层数-k) 的预览图, 耗时)
+    """
+    start = time.time()
+    info = read_progressive_header(compressed)
+    if not 0 <= k <= info['level']:
+        raise ValueError(f"预览级别应在0到{info['level']}之间: {k}")
+    if len(compressed) < prefix_size(info, k):
+        raise ValueError(f"级别{k}需要开头 {prefix_size(info, k)} 字节, 只有 {len(compressed)} 字节")
+
+    view = memoryview(compressed)
+    coeffs = []
+    for j, (band_shape, offset, length) in enumerate(info['index'][:k + 1]):
+        bands = decompress_segment(bytes(view[offset:offset + length]), band_shape,
+                                   1 if j == 0 else 3, info['step'])
+        coeffs.append(bands[0] if j == 0 else tuple(bands))
+    return _reconstruct(info, coeffs), time.time() - start
+
+
+def iter_previews(stream, read_size: int = DEFAULT_READ_SIZE) -> Iterator[Tuple[int, np.ndarray, int]]:
+    """
+    边读边解码, 每读完一段就给出更精细的预览
+
+    参数:
+        stream: 有read()方法的文件对象, 或完整的字节串
+        read_size: 每次读取的字节数
+
+    返回:
+        依次给出 (预览级别, 预览图, 已读取的字节数), 最后一个为完整分辨率
+    """
+    if isinstance(stream, (bytes, bytearray, memoryview)):
+        stream = io.BytesIO(stream)
+    buffer = bytearray()
+    info = None
+    coeffs = []
+    while True:
+        chunk = stream.read(read_size)
+        buffer += chunk
+        if info is None:
+            size = header_size(buffer)
+            if size is not None and len(buffer) >= size:
+                info = read_progressive_header(buffer)
+        # 已解码的段保留系数, 只解码新到达的段
+        while info is not None and len(coeffs) <= info['level'] \
+                and len(buffer) >= prefix_size(info, len(coeffs)):
+            k = len(coeffs)
+            band_shape, offset, length = info['index'][k]
+            bands = decompress_segment(bytes(buffer[offset:offset + length]), band_shape,
+                                       1 if k == 0 else 3, info['step'])
+            coeffs.append(bands[0] if k == 0 else tuple(bands))
+            yield k, _reconstruct(info, coeffs), len(buffer)
+        if info is not None and len(coeffs) > info['level']:
+            return
+        if not chunk:
+            raise ValueError(f"数据不完整: 只读到 {len(buffer)} 字节")
+
+
+def decompress_progressive(compressed: bytes) -> Tuple[np.ndarray, float]:
+    """完整分辨率解压"""
+    start = time.time()
+    info = read_progressive_header(compressed)
+    decompressed, _ = decode_level(compressed, info['level'])
+    return decompressed, time.time() - start
+
+
+# 示例用法
+if __name__ == "__main__":
+    x = np.linspace(0, 1, 4000)
+    arr = (np.sin(10 * x)[:, None] * np.cos(10 * x)[None, :]).astype(np.float32)
+    print(f"测试数组大小: {arr.shape} ({arr.nbytes/1024**2:.2f} MB)")
+
+    compressed, compress_time = compress_progressive(arr, threshold=1e-3, level=6)
+    print(f"压缩后: {len(compressed)/1024:.2f} KB, 压缩时间 {compress_time:.4f} sec")
+
+    info = read_progressive_header(compressed)
+    for k in range(info['level'] + 1):
+        preview, t = decode_level(compressed[:prefix_size(info, k)], k)
+        print(f"级别 {k}: {preview.shape}, 读取前 {prefix_size(info, k)/1024:.2f} KB, "
+              f"解码 {t*1000:.2f} ms")
+
+    decompressed, decompress_time = decompress_progressive(compressed)
+    print(f"完整解压 {decompress_time:.4f} sec, 最大误差 {np.max(np.abs(arr - decompressed)):.2e}")
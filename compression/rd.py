@@ -0,0 +1,223 @@
+"""
+有损编码器的码率-失真曲线
+
+compare_lossy_methods每个编码器只给出一个点. 这里在每个编码器注册时的
+质量参数范围 (tuning, 见tuning.py) 内取若干点, 在进程池中并行测量每个点的
+每值比特数, PSNR, 最大误差, SSIM和压缩/解压吞吐量, 保存为JSON,
+并画出码率-失真曲线和速度-质量曲线.
+
+用法:
+    python rd.py --points 12 --json rd.json --plot rd.png
+"""
+import argparse
+import inspect
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+
+from metrics import compute_metrics
+from more import get_lossy_methods
+from registry import get_codec
+from tuning import _param_at, compressed_size
+
+DEFAULT_POINTS = 8
+
+# 工作进程中的数组, 由进程池的initializer设置, 避免每个任务都序列化一次
+_DATA = None
+
+
+def _init_worker(data: np.ndarray):
+    global _DATA
+    _DATA = data
+
+
+def measure_point(name: str, params: dict, data: np.ndarray = None,
+                  inner_workers: int = None) -> dict:
+    """
+    测量一个(编码器, 参数)点
+
+    参数:
+        inner_workers: 编码器自身支持workers参数时 (如分块小波) 传入的值,
+            外层已经并行时设为1, 避免进程池嵌套
+    """
+    import more  # noqa: F401  工作进程中注册有损编码器
+    data = _DATA if data is None else data
+    codec = get_codec(name, lossless=False)
+    compress_fn, decompress_fn = codec.load()
+    call_params = dict(params)
+    if inner_workers is not None and \
+            'workers' in inspect.signature(compress_fn).parameters:
+        call_params['workers'] = inner_workers
+
+    point = {'codec': name, 'params': params}
+    try:
+        # 模型加载/训练等准备工作不计入压缩时间
+        if codec.warmup:
+            point.update(codec.warmup(**params))
+        compressed, compress_time = compress_fn(data, **call_params)
+        decompressed, decompress_time = decompress_fn(compressed)
+        metrics = compute_metrics(data, decompressed, workers=1)
+    except Exception as e:
+        point.update(available=False, error=str(e))
+        return point
+
+    size = compressed_size(compressed)
+    point.update({
+        'compressed_size': size,
+        'compression_ratio': data.nbytes / size,
+        'bits_per_value': 8 * size / data.size,
+        'psnr': float(metrics['psnr']),
+        'max_error': float(metrics['max_error']),
+        'mean_error': float(metrics['mean_error']),
+        'ssim': float(metrics['ssim']),
+        'compress_time': compress_time,
+        'decompress_time': decompress_time,
+        # MB/s
+        'throughput_compress': data.nbytes / max(compress_time, 1e-6) / (1024**2),
+        'throughput_decompress': data.nbytes / max(decompress_time, 1e-6) / (1024**2),
+        'available': True,
+        'error': None,
+    })
+    return point
+
+
+def rd_configurations(data: np.ndarray, n_points: int = DEFAULT_POINTS,
+                      codecs: List[str] = None) -> List[tuple]:
+    """
+    列出所有(编码器, 参数)点, 参数在tuning范围内从最接近无损到损失最大均匀分布
+
+    返回:
+        [(名称, 参数), ...]
+    """
+    value_range = float(np.max(data) - np.min(data)) or 1.0
+    configs = []
+    for name in get_lossy_methods(data):
+        codec = get_codec(name, lossless=False)
+        if not codec.tuning or (codecs and name not in codecs):
+            continue
+        for t in np.linspace(0, 1, n_points):
+            value = _param_at(codec.tuning, float(t), value_range, data.dtype.name)
+            configs.append((name, {**codec.params, codec.tuning['param']: value}))
+    return configs
+
+
+def run_rd_sweep(data: np.ndarray, n_points: int = DEFAULT_POINTS,
+                 codecs: List[str] = None, workers: int = None) -> List[dict]:
+    """
+    并行测量所有点
+
+    多个点同时运行时会互相争用CPU, 吞吐量要在相同的workers下比较.
+    """
+    workers = workers or os.cpu_count() or 1
+    configs = rd_configurations(data, n_points, codecs)
+    # 不能并行调用的编码器 (如tf_nn) 在主进程中串行测量
+    parallel = [i for i, (name, _) in enumerate(configs)
+                if get_codec(name, lossless=False).parallel_safe]
+    if workers <= 1 or len(parallel) <= 1:
+        return [measure_point(name, params, data) for name, params in configs]
+    points = [None] * len(configs)
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(data,)) as pool:
+        futures = {i: pool.submit(measure_point, *configs[i], inner_workers=1)
+                   for i in parallel}
+        for i, (name, params) in enumerate(configs):
+            if i not in futures:
+                points[i] = measure_point(name, params, data)
+        for i, future in futures.items():
+            points[i] = future.result()
+    return points
+
+
+def print_rd_results(points: List[dict]):
+    """打印每个点"""
+    print(f"\n{'codec':<10} {'param':>18} {'bits/val':>9} {'PSNR':>8} {'max err':>10} "
+          f"{'SSIM':>7} {'comp MB/s':>10} {'dec MB/s':>10}")
+    for p in points:
+        name = p['codec']
+        param = get_codec(name, lossless=False).tuning['param']
+        label = f"{param}={p['params'][param]:.4g}"
+        if not p['available']:
+            print(f"{name:<10} {label:>18} 失败: {p['error']}")
+            continue
+        print(f"{name:<10} {label:>18} {p['bits_per_value']:>9.3f} {p['psnr']:>8.2f} "
+              f"{p['max_error']:>10.2e} {p['ssim']:>7.4f} "
+              f"{p['throughput_compress']:>10.2f} {p['throughput_decompress']:>10.2f}")
+
+
+def plot_rd_curves(points: List[dict], path: str):
+    """左图为码率-失真曲线, 右图为速度-质量曲线"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, (ax_rd, ax_speed) = plt.subplots(1, 2, figsize=(13, 5))
+    ok = [p for p in points if p['available'] and np.isfinite(p['psnr'])]
+    for codec in sorted({p['codec'] for p in ok}):
+        sub = sorted((p for p in ok if p['codec'] == codec),
+                     key=lambda p: p['bits_per_value'])
+        ax_rd.plot([p['bits_per_value'] for p in sub], [p['psnr'] for p in sub],
+                   'o-', markersize=4, label=codec)
+        line, = ax_speed.plot([p['psnr'] for p in sub],
+                              [p['throughput_compress'] for p in sub],
+                              'o-', markersize=4, label=f'{codec} compress')
+        ax_speed.plot([p['psnr'] for p in sub],
+                      [p['throughput_decompress'] for p in sub],
+                      's--', markersize=4, color=line.get_color(),
+                      label=f'{codec} decompress')
+
+    ax_rd.set_xscale('log')
+    ax_rd.set_xlabel('Bits per value')
+    ax_rd.set_ylabel('PSNR (dB)')
+    ax_rd.set_title('Rate-distortion')
+    ax_speed.set_yscale('log')
+    ax_speed.set_xlabel('PSNR (dB)')
+    ax_speed.set_ylabel('Throughput (MB/s)')
+    ax_speed.set_title('Speed vs quality')
+    for ax in (ax_rd, ax_speed):
+        ax.grid(True, which='both', alpha=0.3)
+        ax.legend(fontsize=8)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="有损编码器的码率-失真曲线")
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--cols', type=int, default=1000)
+    parser.add_argument('--points', type=int, default=DEFAULT_POINTS,
+                        help="每个编码器的参数点数")
+    parser.add_argument('--codecs', nargs='*', help="只扫描这些编码器")
+    parser.add_argument('--workers', type=int, default=None, help="进程数")
+    parser.add_argument('--json', help="所有点的结果写入JSON文件")
+    parser.add_argument('--plot', help="曲线图输出路径")
+    args = parser.parse_args(argv)
+
+    # 与more.py示例相同的测试数据
+    x = np.linspace(0, 1, args.cols)
+    y = np.linspace(0, 1, args.rows)
+    xx, yy = np.meshgrid(x, y)
+    data = (np.sin(10*xx) * np.cos(10*yy) +
+            np.random.default_rng(0).random((args.rows, args.cols)) * 0.1).astype(np.float32)
+
+    start = time.time()
+    points = run_rd_sweep(data, args.points, args.codecs, args.workers)
+    print_rd_results(points)
+    print(f"\n共 {len(points)} 个点, 耗时 {time.time() - start:.2f} sec")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': {'shape': list(data.shape), 'dtype': data.dtype.name},
+                       'points': points}, f, indent=2)
+    if args.plot:
+        plot_rd_curves(points, args.plot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""
+编码器注册表
+
+每个编码器声明自己的能力 (无损/有损, 支持的数据类型和维数, 能否并行),
+以及依赖的后端模块. 注册时不导入后端, 只在第一次使用时才加载,
+methods字典由注册表生成.
+"""
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class Codec:
+    """注册表中的一个编码器"""
+    name: str
+    # 第一次使用时调用, 返回(压缩函数, 解压函数)
+    loader: Callable[[], Tuple[Callable, Callable]]
+    lossless: bool = True
+    # None表示不限制
+    dtypes: Optional[Tuple[str, ...]] = None
+    ndims: Optional[Tuple[int, ...]] = None
+    # 能否在进程池/线程池中并行调用, 为False时rd.py和batch.py在主进程中串行运行
+    parallel_safe: bool = True
+    # 依赖的后端模块名称
+    requires: Tuple[str, ...] = ()
+    # 有损编码器的默认参数
+    params: dict = field(default_factory=dict)
+    # 有损编码器的质量参数搜索范围, 见tuning.py:
+    # {'param': 参数名, 'low': 最接近无损的值, 'high': 损失最大的值,
+    #  'log': 是否按对数刻度搜索, 'relative': 是否乘以数据的取值范围,
+    #  'integer': 是否取整}; low/high可以是 {数据类型名称: 值} 的字典
+    tuning: dict = field(default_factory=dict)
+    # 计时之前用默认参数调用一次 (如加载或训练模型), 返回要并入结果的信息
+    warmup: Optional[Callable[..., dict]] = None
+    _pair: Optional[Tuple[Callable, Callable]] = field(default=None, repr=False)
+
+    @property
+    def missing(self) -> List[str]:
+        """缺少的后端模块, 只查找不导入"""
+        return [m for m in self.requires if importlib.util.find_spec(m) is None]
+
+    @property
+    def available(self) -> bool:
+        return not self.missing
+
+    def supports(self, data: np.ndarray) -> bool:
+        """是否支持该数组的数据类型和维数"""
+        if self.dtypes is not None and data.dtype.name not in self.dtypes:
+            return False
+        if self.ndims is not None and data.ndim not in self.ndims:
+            return False
+        return True
+
+    def load(self) -> Tuple[Callable, Callable]:
+        """加载并缓存(压缩函数, 解压函数)"""
+        if self._pair is None:
+            if self.missing:
+                raise ImportError(f"{', '.join(self.missing)} not available")
+            self._pair = tuple(self.loader())
+        return self._pair
+
+
+# {'lossless' / 'lossy': {名称: Codec}}
+REGISTRY: Dict[str, Dict[str, Codec]] = {'lossless': {}, 'lossy': {}}
+
+
+def _kind(lossless: bool) -> str:
+    return 'lossless' if lossless else 'lossy'
+
+
+def register_codec(name: str, loader: Callable, lossless: bool = True, **capabilities) -> Codec:
+    """
+    注册编码器, 同名的已有编码器会被替换
+
+    参数:
+        name: 名称, 即methods字典的键
+        loader: 返回(压缩函数, 解压函数)的无参函数
+        lossless: 是否无损
+        capabilities: Codec的其余字段
+    """
+    codec = Codec(name=name, loader=loader, lossless=lossless, **capabilities)
+    REGISTRY[_kind(lossless)][name] = codec
+    return codec
+
+
+def get_codec(name: str, lossless: bool = True) -> Codec:
+    return REGISTRY[_kind(lossless)][name]
+
+
+def is_parallel_safe(name: str, lossless: bool = True) -> bool:
+    """能否在进程池/线程池中调用, 未注册的名称 (如auto) 视为可以"""
+    codec = REGISTRY[_kind(lossless)].get(name)
+    return codec is None or codec.parallel_safe
+
+
+def list_codecs(lossless: bool = True, data: np.ndarray = None,
+                available_only: bool = True) -> List[Codec]:
+    """
+    按注册顺序列出编码器
+
+    参数:
+        lossless: 列出无损还是有损编码器
+        data: 给出时只列出支持该数组的编码器
+        available_only: 是否跳过缺少后端的编码器
+    """
+    codecs = REGISTRY[_kind(lossless)].values()
+    return [c for c in codecs
+            if (not available_only or c.available)
+            and (data is None or c.supports(data))]
+
+
+def build_methods(lossless: bool = True, data: np.ndarray = None) -> Dict[str, tuple]:
+    """
+    由注册表生成methods字典
+
+    返回:
+        无损: {名称: (压缩函数, 解压函数)}
+        有损: {名称: (压缩函数, 解压函数, 默认参数)}
+    """
+    methods = {}
+    for codec in list_codecs(lossless, data):
+        pair = codec.load()
+        methods[codec.name] = pair if lossless else (*pair, codec.params)
+    return methods
@@ -0,0 +1,181 @@
+"""
+帧间差分编码器
+
+用于连续二维帧组成的序列 (沿第0维堆叠). 每隔keyframe_interval帧存一个关键帧,
+其余帧存与前一帧浮点比特模式的XOR (或模运算差), 再交给已有的
+compress_*函数压缩. 随机读取某一帧最多只需解码一个关键帧间隔.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 差分方式(1) | 关键帧间隔(I) | 帧数(I)
+    | 每帧压缩长度(Q * 帧数) | 帧数据...
+"""
+import struct
+import time
+from functools import partial
+from typing import Callable, Iterator, List, Tuple
+
+import numpy as np
+
+MAGIC = b'SEQD'
+VERSION = 1
+HEADER = struct.Struct('<4sBBII')
+MODES = ['xor', 'sub']
+
+DEFAULT_KEYFRAME_INTERVAL = 16
+
+
+def _uint_dtype(dtype) -> np.dtype:
+    return np.dtype(f'<u{np.dtype(dtype).itemsize}')
+
+
+def _delta(frame: np.ndarray, previous: np.ndarray, mode: str) -> np.ndarray:
+    if mode == 'xor':
+        return np.bitwise_xor(frame, previous)
+    return frame - previous
+
+
+def _undelta(delta: np.ndarray, previous: np.ndarray, mode: str) -> np.ndarray:
+    if mode == 'xor':
+        return np.bitwise_xor(delta, previous)
+    return delta + previous
+
+
+def compress_sequence(data: np.ndarray, compress_fn: Callable,
+                      keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL,
+                      mode: str = 'xor') -> Tuple[bytes, float]:
+    """
+    帧间差分压缩
+
+    参数:
+        data: 沿第0维堆叠的帧序列
+        compress_fn: 单帧压缩函数, 与compress_*签名一致
+        keyframe_interval: 关键帧间隔
+        mode: 'xor' 按位异或, 'sub' 等宽无符号整数的模运算差
+
+    返回:
+        (压缩后的字节串, 耗时)
+    """
+    start = time.time()
+    uint_dtype = _uint_dtype(data.dtype)
+    payloads = []
+    previous = None
+    for t in range(data.shape[0]):
+        frame = np.ascontiguousarray(data[t])
+        bits = frame.view(uint_dtype)
+        if t % keyframe_interval == 0:
+            compressed, _ = compress_fn(frame)
+        else:
+            compressed, _ = compress_fn(_delta(bits, previous, mode))
+        payloads.append(compressed)
+        previous = bits
+
+    header = HEADER.pack(MAGIC, VERSION, MODES.index(mode),
+                         keyframe_interval, len(payloads))
+    index = struct.pack(f'<{len(payloads)}Q', *[len(p) for p in payloads])
+    return b''.join([header, index, *payloads]), time.time() - start
+
+
+def read_sequence_index(compressed: bytes) -> Tuple[str, int, List[Tuple[int, int]]]:
+    """
+    读取帧索引
+
+    返回:
+        (差分方式, 关键帧间隔, [(偏移, 长度), ...])
+    """
+    magic, version, mode, interval, n_frames = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是帧间差分格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的帧间差分格式版本: {version}")
+    lengths = struct.unpack_from(f'<{n_frames}Q', compressed, HEADER.size)
+    offset = HEADER.size + 8 * n_frames
+    index = []
+    for length in lengths:
+        index.append((offset, length))
+        offset += length
+    return MODES[mode], interval, index
+
+
+def iter_frames(compressed: bytes, frame_shape: tuple, dtype, decompress_fn: Callable,
+                start: int = 0, stop: int = None) -> Iterator[np.ndarray]:
+    """
+    逐帧流式解压, 内存中只保留前一帧
+
+    从start之前最近的关键帧开始解码, 产生第start到stop-1帧.
+    """
+    mode, interval, index = read_sequence_index(compressed)
+    stop = len(index) if stop is None else min(stop, len(index))
+    dtype = np.dtype(dtype)
+    uint_dtype = _uint_dtype(dtype)
+    view = memoryview(compressed)
+
+    previous = None
+    for t in range(start - start % interval, stop):
+        offset, length = index[t]
+        blob = bytes(view[offset:offset + length])
+        if t % interval == 0:
+            frame, _ = decompress_fn(blob, frame_shape, dtype)
+            bits = np.asarray(frame).reshape(frame_shape).view(uint_dtype)
+        else:
+            delta, _ = decompress_fn(blob, frame_shape, uint_dtype)
+            bits = _undelta(np.asarray(delta).reshape(frame_shape), previous, mode)
+        previous = bits
+        if t >= start:
+            yield bits.view(dtype)
+
+
+def read_frame(compressed: bytes, t: int, frame_shape: tuple, dtype,
+               decompress_fn: Callable) -> np.ndarray:
+    """随机读取第t帧"""
+    return next(iter_frames(compressed, frame_shape, dtype, decompress_fn,
+                            start=t, stop=t + 1))
+
+
+def decompress_sequence(compressed: bytes, original_shape: tuple, dtype,
+                        decompress_fn: Callable) -> Tuple[np.ndarray, float]:
+    """帧间差分解压整个序列"""
+    start = time.time()
+    decompressed = np.empty(original_shape, dtype=dtype)
+    for t, frame in enumerate(iter_frames(compressed, original_shape[1:],
+                                          dtype, decompress_fn)):
+        decompressed[t] = frame
+    return decompressed, time.time() - start
+
+
+def make_sequence_pair(compress_fn: Callable, decompress_fn: Callable,
+                       **kwargs) -> Tuple[Callable, Callable]:
+    """
+    把已有的compress_*/decompress_*函数对包装为帧间差分版本
+    """
+    return (partial(compress_sequence, compress_fn=compress_fn, **kwargs),
+            partial(decompress_sequence, decompress_fn=decompress_fn))
+
+
+# 示例用法
+if __name__ == "__main__":
+    from main import compress_zlib, decompress_zlib
+    from filters import make_filtered_pair
+
+    # 缓慢变化的二维场序列
+    n_frames, rows, cols = 64, 256, 256
+    x = np.linspace(0, 1, cols, dtype=np.float32)
+    y = np.linspace(0, 1, rows, dtype=np.float32)[:, None]
+    frames = np.stack([np.sin(10 * x + 0.01 * t) * np.cos(10 * y)
+                       for t in range(n_frames)]).astype(np.float32)
+    frames[:, ::8, ::8] = 1.0
+
+    compress_fn, decompress_fn = make_filtered_pair(
+        'shuffle', compress_zlib, decompress_zlib)
+    independent = sum(len(compress_fn(f)[0]) for f in frames)
+    print(f"逐帧独立压缩: {frames.nbytes / independent:.2f}x")
+
+    for mode in MODES:
+        compressed, compress_time = compress_sequence(
+            frames, compress_fn, mode=mode)
+        decompressed, decompress_time = decompress_sequence(
+            compressed, frames.shape, frames.dtype, decompress_fn)
+        assert np.array_equal(decompressed, frames)
+        assert np.array_equal(read_frame(compressed, 37, frames.shape[1:],
+                                         frames.dtype, decompress_fn), frames[37])
+        print(f"帧间差分({mode}): {frames.nbytes / len(compressed):.2f}x, "
+              f"压缩 {compress_time:.3f} sec, 解压 {decompress_time:.3f} sec")
@@ -0,0 +1,178 @@
+"""
+流式(核外)压缩
+
+把磁盘上的.npy文件按固定大小切片送入zlib.compressobj/bz2.BZ2Compressor,
+边读边写, 峰值内存只与切片大小有关, 与数组大小无关.
+
+压缩文件格式:
+    MAGIC(4) | 编码器编号(1) | 压缩后的完整.npy字节流 (文件头 + 数据)
+解压得到与原文件逐字节一致的.npy文件, 可再用np.load(mmap_mode='r')打开.
+"""
+import bz2
+import sys
+import time
+import zlib
+from typing import Tuple
+
+import numpy as np
+
+MAGIC = b'NPYS'
+CODECS = ['zlib', 'bz2']
+
+# 默认切片大小 (字节)
+DEFAULT_CHUNK_SIZE = 4 * 1024**2
+
+
+def _make_compressor(codec: str, level: int):
+    if codec == 'zlib':
+        return zlib.compressobj(level)
+    if codec == 'bz2':
+        return bz2.BZ2Compressor(level)
+    raise ValueError(f"未知的编码器: {codec}")
+
+
+def compress_npy_stream(src: str, dst: str, codec: str = 'zlib', level: int = 9,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, float]:
+    """
+    流式压缩.npy文件
+
+    参数:
+        src: 源.npy文件路径
+        dst: 压缩输出文件路径
+        codec: 'zlib' 或 'bz2'
+        level: 压缩级别
+        chunk_size: 每次读取的切片大小 (字节)
+
+    返回:
+        (压缩后大小, 耗时)
+    """
+    start = time.time()
+    # 只用内存映射读取形状和数据偏移, 不触碰数据页
+    arr = np.load(src, mmap_mode='r')
+    header_size = arr.offset
+    del arr
+
+    compressor = _make_compressor(codec, level)
+    # 复用同一块缓冲区, 避免每个切片重新分配
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    compressed_size = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        fout.write(MAGIC + bytes([CODECS.index(codec)]))
+        compressed_size += len(MAGIC) + 1
+        # .npy文件头与数据一起进入压缩流
+        out = compressor.compress(fin.read(header_size))
+        fout.write(out)
+        compressed_size += len(out)
+        while n := fin.readinto(buffer):
+            out = compressor.compress(view[:n])
+            fout.write(out)
+            compressed_size += len(out)
+        out = compressor.flush()
+        fout.write(out)
+        compressed_size += len(out)
+    return compressed_size, time.time() - start
+
+
+def decompress_npy_stream(src: str, dst: str,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[int, float]:
+    """
+    流式解压为.npy文件
+
+    参数:
+        src: compress_npy_stream的输出文件
+        dst: 解压后的.npy文件路径
+        chunk_size: 每次读取和输出的最大字节数
+
+    返回:
+        (解压后大小, 耗时)
+    """
+    start = time.time()
+    decompressed_size = 0
+    with open(src, 'rb') as fin, open(dst, 'wb') as fout:
+        magic = fin.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError("不是流式压缩格式的文件")
+        codec = CODECS[fin.read(1)[0]]
+
+        if codec == 'zlib':
+            decompressor = zlib.decompressobj()
+            while chunk := fin.read(chunk_size):
+                # 限制单次输出长度, 未消耗的输入留在unconsumed_tail
+                while chunk:
+                    out = decompressor.decompress(chunk, chunk_size)
+                    fout.write(out)
+                    decompressed_size += len(out)
+                    chunk = decompressor.unconsumed_tail
+            out = decompressor.flush()
+            fout.write(out)
+            decompressed_size += len(out)
+        else:
+            decompressor = bz2.BZ2Decompressor()
+            while chunk := fin.read(chunk_size):
+                out = decompressor.decompress(chunk, chunk_size)
+                fout.write(out)
+                decompressed_size += len(out)
+                while not decompressor.needs_input and not decompressor.eof:
+                    out = decompressor.decompress(b'', chunk_size)
+                    fout.write(out)
+                    decompressed_size += len(out)
+    return decompressed_size, time.time() - start
+
+
+def peak_rss_mb() -> float:
+    """当前进程的峰值常驻内存 (MB), 不支持的平台返回nan"""
+    try:
+        import resource
+    except ImportError:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux的单位为KB, macOS为字节
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _write_demo_file(path: str, rows: int, cols: int):
+    """通过内存映射逐块写入测试数据 (在子进程中运行, 不计入本进程的峰值内存)"""
+    arr = np.lib.format.open_memmap(path, mode='w+', dtype=np.float32, shape=(rows, cols))
+    for i in range(0, rows, 512):
+        block = np.random.rand(512, cols).astype(np.float32)
+        block[:, ::10] = 1.0
+        arr[i:i + 512] = block
+    arr.flush()
+    del arr
+
+
+# 示例用法
+if __name__ == "__main__":
+    import multiprocessing
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        src = os.path.join(tmp, 'data.npy')
+        rows, cols = 8192, 4096
+        print("创建测试数据...")
+        # 在子进程中写文件, 写入时的脏页不会抬高本进程的峰值内存
+        writer = multiprocessing.Process(target=_write_demo_file, args=(src, rows, cols))
+        writer.start()
+        writer.join()
+        original_size = os.path.getsize(src)
+        print(f"测试文件大小: {original_size/1024**2:.2f} MB")
+        print(f"初始峰值内存: {peak_rss_mb():.2f} MB")
+
+        for codec in CODECS:
+            dst = os.path.join(tmp, f'data.npy.{codec}')
+            out = os.path.join(tmp, f'data.{codec}.npy')
+            compressed_size, compress_time = compress_npy_stream(
+                src, dst, codec=codec)
+            decompressed_size, decompress_time = decompress_npy_stream(
+                dst, out)
+            assert decompressed_size == original_size
+
+            print(f"方法: {codec.upper()}")
+            print(f"  压缩率: {original_size / compressed_size:.2f}x")
+            print(
+                f"  压缩吞吐量: {original_size / max(compress_time, 1e-6) / 1024**2:.2f} MB/s")
+            print(
+                f"  解压吞吐量: {original_size / max(decompress_time, 1e-6) / 1024**2:.2f} MB/s")
+            print(f"  峰值内存: {peak_rss_mb():.2f} MB")
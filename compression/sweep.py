@@ -0,0 +1,161 @@
+"""
+压缩级别扫描与Pareto前沿
+
+对每种可用编码器的每个级别 (包括lzma预设) 做基准测试, 找出压缩率-吞吐量
+平面上的非支配配置, 输出表格和散点图.
+
+用法:
+    python sweep.py --repeat 3 --json sweep.json --plot sweep.png
+"""
+import argparse
+import json
+import sys
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from benchmark import benchmark_method, make_demo_data
+from filters import make_filtered_pair
+from main import (HDF5_AVAILABLE, compress_bz2, compress_hdf5, compress_lzma,
+                  compress_zlib, decompress_bz2, decompress_hdf5,
+                  decompress_lzma, decompress_zlib)
+
+# 编码器名称 -> (带level参数的压缩函数, 解压函数, 级别范围)
+LEVELED_CODECS = {
+    'zlib': (compress_zlib, decompress_zlib, range(0, 10)),
+    'bz2': (compress_bz2, decompress_bz2, range(1, 10)),
+    'lzma': (compress_lzma, decompress_lzma, range(0, 10)),
+}
+if HDF5_AVAILABLE:
+    LEVELED_CODECS['hdf5_gzip'] = (compress_hdf5, decompress_hdf5, range(1, 10))
+
+# 与字节编码器组合扫描的预过滤管线
+SWEEP_PIPELINES = ['shuffle']
+
+
+def sweep_configurations(pipelines: List[str] = None) -> Dict[Tuple[str, int], Tuple[Callable, Callable]]:
+    """
+    列出所有(编码器, 级别)配置
+
+    返回:
+        {(名称, 级别): (压缩函数, 解压函数)}
+    """
+    pipelines = SWEEP_PIPELINES if pipelines is None else pipelines
+    configs = {}
+    for name, (compress_fn, decompress_fn, levels) in LEVELED_CODECS.items():
+        for level in levels:
+            leveled = partial(compress_fn, level=level)
+            configs[(name, level)] = (leveled, decompress_fn)
+            for pipeline in pipelines:
+                configs[(f'{pipeline}+{name}', level)] = make_filtered_pair(
+                    pipeline, leveled, decompress_fn)
+    return configs
+
+
+def run_sweep(data: np.ndarray, pipelines: List[str] = None,
+              warmup: int = 1, repeat: int = 3) -> List[dict]:
+    """
+    对每个配置做基准测试
+
+    返回:
+        每个配置一项的列表, 包含名称, 级别, 压缩率和吞吐量中位数
+    """
+    points = []
+    for (name, level), (compress_fn, decompress_fn) in sweep_configurations(pipelines).items():
+        try:
+            info = benchmark_method(data, compress_fn, decompress_fn,
+                                    warmup=warmup, repeat=repeat,
+                                    measure_memory=False)
+        except Exception as e:
+            print(f"{name} level {level} 失败: {e}")
+            continue
+        points.append({
+            'codec': name,
+            'level': level,
+            'compression_ratio': info['compression_ratio'],
+            'throughput_compress': info['compress']['median'],
+            'throughput_decompress': info['decompress']['median'],
+        })
+    return points
+
+
+def pareto_frontier(points: List[dict], x: str = 'throughput_compress',
+                    y: str = 'compression_ratio') -> List[dict]:
+    """
+    求x和y都越大越好的非支配点, 按x从大到小排列
+    """
+    frontier = []
+    best_y = -np.inf
+    for p in sorted(points, key=lambda p: (-p[x], -p[y])):
+        if p[y] > best_y:
+            frontier.append(p)
+            best_y = p[y]
+    return frontier
+
+
+def print_frontier(frontier: List[dict]):
+    """打印Pareto前沿表格"""
+    print("\nPareto前沿 (压缩率 vs 压缩吞吐量):")
+    print(f"{'codec':<16} {'level':>5} {'ratio':>8} {'comp MB/s':>10} {'dec MB/s':>10}")
+    for p in frontier:
+        print(f"{p['codec']:<16} {p['level']:>5} {p['compression_ratio']:>8.3f} "
+              f"{p['throughput_compress']:>10.2f} {p['throughput_decompress']:>10.2f}")
+
+
+def plot_frontier(points: List[dict], frontier: List[dict], path: str):
+    """画出所有配置和Pareto前沿"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    for codec in sorted({p['codec'] for p in points}):
+        sub = [p for p in points if p['codec'] == codec]
+        ax.scatter([p['throughput_compress'] for p in sub],
+                   [p['compression_ratio'] for p in sub], label=codec, s=20)
+    ax.plot([p['throughput_compress'] for p in frontier],
+            [p['compression_ratio'] for p in frontier],
+            'k--', linewidth=1, label='Pareto frontier')
+    for p in frontier:
+        ax.annotate(f"{p['codec']}:{p['level']}",
+                    (p['throughput_compress'], p['compression_ratio']),
+                    fontsize=7, xytext=(3, 3), textcoords='offset points')
+    ax.set_xscale('log')
+    ax.set_xlabel('Compress throughput (MB/s)')
+    ax.set_ylabel('Compression ratio')
+    ax.grid(True, which='both', alpha=0.3)
+    ax.legend(fontsize=8)
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="压缩级别扫描与Pareto前沿")
+    parser.add_argument('--rows', type=int, default=500)
+    parser.add_argument('--cols', type=int, default=500)
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--pipelines', nargs='*', default=SWEEP_PIPELINES,
+                        help="与编码器组合的预过滤管线")
+    parser.add_argument('--json', help="所有配置的结果写入JSON文件")
+    parser.add_argument('--plot', help="散点图输出路径")
+    args = parser.parse_args(argv)
+
+    data = make_demo_data(args.rows, args.cols)
+    points = run_sweep(data, args.pipelines,
+                       warmup=args.warmup, repeat=args.repeat)
+    frontier = pareto_frontier(points)
+    print_frontier(frontier)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'points': points, 'frontier': frontier}, f, indent=2)
+    if args.plot:
+        plot_frontier(points, frontier, args.plot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
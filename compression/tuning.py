@@ -0,0 +1,261 @@
+"""
+按目标搜索有损编码器的质量参数
+
+compare_lossy_methods使用固定的默认参数 (如zfp的tolerance=1e-3).
+这里改为给定目标:
+    - ratio: 压缩率不低于目标, 在此前提下质量最好
+    - psnr: PSNR不低于目标, 在此前提下压缩率最高
+    - max_error: 最大误差不超过目标, 在此前提下压缩率最高
+在数据的一个子样本上对每个编码器的质量参数 (注册时的tuning范围) 二分搜索,
+再把找到的参数用于整个数组.
+
+用法:
+    python tuning.py --target psnr --value 60
+    python tuning.py --target ratio --value 20
+"""
+import argparse
+import math
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from metrics import error_metrics
+from more import calculate_metrics, print_comparison_results
+from registry import list_codecs
+
+TARGETS = ['ratio', 'psnr', 'max_error']
+
+# 子样本的默认字节数上限
+DEFAULT_SAMPLE_BYTES = 4 * 1024**2
+# 子样本每维至少保留的长度
+MIN_SAMPLE_DIM = 64
+DEFAULT_MAX_ITER = 20
+# 在[0, 1]的搜索位置上收敛的精度
+DEFAULT_TOLERANCE = 1e-3
+
+
+def subsample(data: np.ndarray, max_bytes: int = DEFAULT_SAMPLE_BYTES) -> np.ndarray:
+    """
+    取位于中心的连续子块作为子样本
+
+    保留空间相关性 (随机抽取的行会破坏小波/PCA等编码器依赖的结构),
+    每维按相同比例缩小, 使子块不超过max_bytes.
+    """
+    if data.nbytes <= max_bytes:
+        return data
+    scale = (max_bytes / data.nbytes) ** (1 / data.ndim)
+    region = []
+    for n in data.shape:
+        m = min(n, max(MIN_SAMPLE_DIM, int(n * scale)))
+        lo = (n - m) // 2
+        region.append(slice(lo, lo + m))
+    return np.ascontiguousarray(data[tuple(region)])
+
+
+def compressed_size(compressed) -> int:
+    """压缩结果的字节数, 非字节串的结果按sys.getsizeof估计"""
+    if isinstance(compressed, (bytes, bytearray, memoryview)):
+        return len(compressed)
+    return sys.getsizeof(compressed)
+
+
+def _param_at(tuning: dict, t: float, value_range: float, dtype: str = None) -> float:
+    """
+    搜索位置t (0为最接近无损, 1为损失最大) 对应的参数值
+
+    low/high可以是 {数据类型名称: 值} 的字典, 按dtype取值.
+    """
+    low, high = tuning['low'], tuning['high']
+    if isinstance(low, dict):
+        low = low[dtype]
+    if isinstance(high, dict):
+        high = high[dtype]
+    if tuning.get('log', True):
+        value = math.exp(math.log(low) + t * (math.log(high) - math.log(low)))
+    else:
+        value = low + t * (high - low)
+    if tuning.get('relative', False):
+        value *= value_range
+    if tuning.get('integer', False):
+        value = max(1, round(value))
+    return value
+
+
+def evaluate(data: np.ndarray, compress_fn: Callable, decompress_fn: Callable,
+             params: dict) -> dict:
+    """压缩并解压一次, 返回压缩率, PSNR和最大误差 (用metrics.error_metrics计算)"""
+    compressed, _ = compress_fn(data, **params)
+    decompressed, _ = decompress_fn(compressed)
+    metrics = error_metrics(data, np.asarray(decompressed).reshape(data.shape))
+    return {
+        'ratio': data.nbytes / compressed_size(compressed),
+        'psnr': float(metrics['psnr']),
+        'max_error': float(metrics['max_error']),
+    }
+
+
+def _feasible(measured: dict, target: str, value: float) -> bool:
+    if target == 'ratio':
+        return measured['ratio'] >= value
+    if target == 'psnr':
+        return measured['psnr'] >= value
+    return measured['max_error'] <= value
+
+
+def search_parameter(data: np.ndarray, compress_fn: Callable, decompress_fn: Callable,
+                     tuning: dict, target: str, value: float, base_params: dict = None,
+                     max_iter: int = DEFAULT_MAX_ITER,
+                     tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    """
+    在子样本上二分搜索质量参数
+
+    参数越"有损", 压缩率越高, PSNR越低, 最大误差越大. ratio目标取满足条件的
+    最小损失, psnr/max_error目标取满足条件的最大损失.
+
+    返回:
+        {'params': 找到的参数, 'reached': 子样本上是否达到目标,
+         'iterations': 压缩次数, 'search_time': 耗时, 'sample': 子样本上的指标}
+    """
+    start = time.time()
+    if target not in TARGETS:
+        raise ValueError(f"未知的目标: {target}, 可选 {TARGETS}")
+    base_params = dict(base_params or {})
+    value_range = float(np.max(data) - np.min(data)) or 1.0
+    iterations = 0
+
+    def measure(t):
+        nonlocal iterations
+        iterations += 1
+        params = {**base_params, tuning['param']: _param_at(tuning, t, value_range, data.dtype.name)}
+        return params, evaluate(data, compress_fn, decompress_fn, params)
+
+    # ratio目标: 损失越大越容易满足; 质量目标: 损失越小越容易满足
+    lossier_is_feasible = target == 'ratio'
+    easy, hard = (1.0, 0.0) if lossier_is_feasible else (0.0, 1.0)
+
+    best_params, best = measure(easy)
+    reached = _feasible(best, target, value)
+    if reached:
+        params, measured = measure(hard)
+        if _feasible(measured, target, value):
+            # 整个范围都满足, 取另一端
+            best_params, best = params, measured
+        else:
+            # 不变式: easy满足, hard不满足
+            while iterations < max_iter and abs(hard - easy) > tolerance:
+                mid = (easy + hard) / 2
+                params, measured = measure(mid)
+                if _feasible(measured, target, value):
+                    easy, best_params, best = mid, params, measured
+                else:
+                    hard = mid
+
+    return {
+        'params': best_params,
+        'reached': reached,
+        'iterations': iterations,
+        'search_time': time.time() - start,
+        'sample': best,
+    }
+
+
+def compare_targeted_methods(data: np.ndarray, target: str, value: float,
+                             sample_bytes: int = DEFAULT_SAMPLE_BYTES,
+                             max_iter: int = DEFAULT_MAX_ITER) -> Dict[str, dict]:
+    """
+    对每个可调的有损编码器按目标搜索参数, 再用于整个数组
+
+    返回:
+        与compare_lossy_methods结构相同的字典, 另含 'params', 'reached',
+        'target_met' (整个数组是否达到目标), 'iterations', 'search_time'
+    """
+    sample = subsample(data, sample_bytes)
+    original_size = data.nbytes
+    results = {}
+    for codec in list_codecs(lossless=False, data=data):
+        if not codec.tuning:
+            continue
+        try:
+            compress_fn, decompress_fn = codec.load()
+            search = search_parameter(sample, compress_fn, decompress_fn, codec.tuning,
+                                      target, value, codec.params, max_iter=max_iter)
+
+            compressed, compress_time = compress_fn(data, **search['params'])
+            decompressed, decompress_time = decompress_fn(compressed)
+            metrics = calculate_metrics(data, decompressed)
+            size = compressed_size(compressed)
+            measured = {'ratio': original_size / size, 'psnr': metrics['psnr'],
+                        'max_error': metrics['max_error']}
+
+            results[codec.name] = {
+                'original_size': original_size,
+                'compressed_size': size,
+                'compression_ratio': original_size / size,
+                'compress_time': compress_time,
+                'decompress_time': decompress_time,
+                'throughput_compress': original_size / max(compress_time, 1e-6) / (1024**2),
+                'throughput_decompress': original_size / max(decompress_time, 1e-6) / (1024**2),
+                'max_error': metrics['max_error'],
+                'mean_error': metrics['mean_error'],
+                'psnr': metrics['psnr'],
+                'ssim': metrics['ssim'],
+                'params': search['params'],
+                'reached': search['reached'],
+                'target_met': _feasible(measured, target, value),
+                'iterations': search['iterations'],
+                'search_time': search['search_time'],
+                'available': True,
+                'error': None
+            }
+        except Exception as e:
+            results[codec.name] = {
+                'available': False,
+                'error': str(e)
+            }
+    return results
+
+
+def print_search_results(results: Dict[str, dict], target: str, value: float):
+    """打印搜索过程和达到的目标"""
+    print(f"\n目标: {target} {'>=' if target != 'max_error' else '<='} {value}")
+    for name, info in results.items():
+        if not info['available']:
+            continue
+        params = ', '.join(f"{k}={v:.4g}" for k, v in info['params'].items())
+        status = '达到' if info['target_met'] else \
+            ('子样本达到, 整个数组未达到' if info['reached'] else '未达到')
+        print(f"  {name}: {params}, {status}, "
+              f"搜索 {info['iterations']} 次 {info['search_time']:.3f} sec")
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="按目标搜索有损编码器的质量参数")
+    parser.add_argument('--target', choices=TARGETS, default='psnr')
+    parser.add_argument('--value', type=float, default=60.0)
+    parser.add_argument('--sample-mb', type=float, default=DEFAULT_SAMPLE_BYTES / 1024**2,
+                        help="子样本大小 (MB)")
+    parser.add_argument('--max-iter', type=int, default=DEFAULT_MAX_ITER)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--cols', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    # 与more.py示例相同的测试数据
+    print("创建测试数据...")
+    x = np.linspace(0, 1, args.cols)
+    y = np.linspace(0, 1, args.rows)
+    xx, yy = np.meshgrid(x, y)
+    arr = (np.sin(10*xx) * np.cos(10*yy) +
+           np.random.rand(args.rows, args.cols) * 0.1).astype(np.float32)
+
+    results = compare_targeted_methods(arr, args.target, args.value,
+                                       sample_bytes=int(args.sample_mb * 1024**2),
+                                       max_iter=args.max_iter)
+    print_comparison_results(results)
+    print_search_results(results, args.target, args.value)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""
+分块小波有损编码器
+
+把二维数组切成tile x tile的块, 每块独立地:
+    1. pywt.wavedec2 (周期延拓, 系数个数与块大小相同)
+    2. 硬阈值或软阈值: 绝对值小于threshold的系数置0
+    3. 以step为步长均匀量化为整数
+    4. 选最小的整数类型, byte-shuffle后用zlib做熵编码
+各块在进程池中并行压缩, 解压时也可以只解码其中一块.
+
+压缩格式:
+    MAGIC(4) | 版本(1) | 元素字节数(1) | 分解层数(1) | 阈值方式(1)
+    | 块行数(I) | 块列数(I) | 行数(Q) | 列数(Q) | 阈值(d) | 量化步长(d)
+    | 小波名称长度(B) | 小波名称 | 每块压缩长度(Q * 块数) | 块数据...
+块数据:
+    整数字节数(1) | zlib(byte-shuffle后的量化系数)
+"""
+import os
+import struct
+import time
+import zlib
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+
+from chunked import _map
+from filters import byte_shuffle, byte_unshuffle
+
+MAGIC = b'WVLT'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBIIQQdd')
+MODES = ['hard', 'soft']
+
+DEFAULT_WAVELET = 'bior6.8'
+DEFAULT_LEVEL = 4
+DEFAULT_TILE = 256
+ZLIB_LEVEL = 6
+
+
+@lru_cache(maxsize=None)
+def _tile_layout(tile_shape: tuple, wavelet: str, level: int):
+    """块的实际分解层数和coeffs_to_array的系数位置"""
+    import pywt
+    level = min(level, pywt.dwt_max_level(min(tile_shape), pywt.Wavelet(wavelet).dec_len))
+    coeffs = pywt.wavedec2(np.zeros(tile_shape), wavelet, mode='periodization', level=level)
+    array, slices = pywt.coeffs_to_array(coeffs)
+    return level, array.shape, slices
+
+
+def _smallest_int(q: np.ndarray) -> np.dtype:
+    bound = int(np.max(np.abs(q))) if q.size else 0
+    for dtype in (np.int8, np.int16, np.int32):
+        if bound <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def compress_tile(tile: np.ndarray, wavelet: str, level: int, threshold: float,
+                  step: float, mode: str) -> bytes:
+    """压缩单个块"""
+    import pywt
+    level, _, _ = _tile_layout(tile.shape, wavelet, level)
+    coeffs = pywt.wavedec2(tile.astype(np.float64), wavelet, mode='periodization', level=level)
+    array, _ = pywt.coeffs_to_array(coeffs)
+
+    magnitude = np.abs(array)
+    if mode == 'soft':
+        array = np.sign(array) * np.maximum(magnitude - threshold, 0)
+    else:
+        array = np.where(magnitude < threshold, 0, array)
+    q = np.rint(array / step)
+    dtype = _smallest_int(q)
+    q = q.astype(dtype)
+    return bytes([dtype.itemsize]) + zlib.compress(byte_shuffle(q), ZLIB_LEVEL)
+
+
+def decompress_tile(payload: bytes, tile_shape: tuple, wavelet: str, level: int,
+                    step: float, dtype) -> np.ndarray:
+    """解压单个块"""
+    import pywt
+    level, array_shape, slices = _tile_layout(tile_shape, wavelet, level)
+    int_dtype = np.dtype(f'<i{payload[0]}')
+    q = byte_unshuffle(np.frombuffer(zlib.decompress(payload[1:]), dtype=np.uint8),
+                       array_shape, int_dtype)
+    coeffs = pywt.array_to_coeffs(q * step, slices, output_format='wavedec2')
+    tile = pywt.waverec2(coeffs, wavelet, mode='periodization')
+    return tile[:tile_shape[0], :tile_shape[1]].astype(dtype)
+
+
+def _tile_regions(shape: tuple, tile: Tuple[int, int]) -> List[Tuple[slice, slice]]:
+    """按行优先顺序的每块范围"""
+    rows, cols = shape
+    return [(slice(i, min(i + tile[0], rows)), slice(j, min(j + tile[1], cols)))
+            for i in range(0, rows, tile[0]) for j in range(0, cols, tile[1])]
+
+
+def compress_wavelet(data: np.ndarray, threshold: float = 0.05, step: float = None,
+                     mode: str = 'hard', wavelet: str = DEFAULT_WAVELET,
+                     level: int = DEFAULT_LEVEL, tile: int = DEFAULT_TILE,
+                     workers: int = None, executor: str = 'process') -> Tuple[bytes, float]:
+    """
+    使用分块小波变换有损压缩
+
+    参数:
+        data: 要压缩的二维数组
+        threshold: 系数阈值 (与数据同单位), 绝对值小于它的系数置0
+        step: 量化步长, 默认与threshold相同
+        mode: 'hard' 硬阈值, 'soft' 软阈值 (其余系数向0收缩threshold)
+        tile: 块的边长
+        workers: 并行数, 默认为CPU核数
+
+    返回:
+        (压缩后的字节串, 耗时)
+    """
+    start = time.time()
+    if data.ndim != 2:
+        raise ValueError(f"小波编码器只支持二维数组, 得到 {data.ndim} 维")
+    if mode not in MODES:
+        raise ValueError(f"未知的阈值方式: {mode}, 可选 {MODES}")
+    if threshold <= 0 and not step:
+        raise ValueError("threshold和step不能都为0")
+    step = step or threshold
+    workers = workers or os.cpu_count() or 1
+    tile_shape = (tile, tile)
+
+    args = [(np.ascontiguousarray(data[region]), wavelet, level, threshold, step, mode)
+            for region in _tile_regions(data.shape, tile_shape)]
+    payloads = _map(compress_tile, args, workers, executor)
+
+    name = wavelet.encode()
+    header = HEADER.pack(MAGIC, VERSION, data.dtype.itemsize, level, MODES.index(mode),
+                         *tile_shape, *data.shape, threshold, step)
+    index = struct.pack(f'<{len(payloads)}Q', *[len(p) for p in payloads])
+    return b''.join([header, bytes([len(name)]), name, index, *payloads]), time.time() - start
+
+
+def read_wavelet_header(compressed: bytes) -> dict:
+    """读取头部和块索引"""
+    (magic, version, itemsize, level, mode, tile_rows, tile_cols,
+     rows, cols, threshold, step) = HEADER.unpack_from(compressed, 0)
+    if magic != MAGIC:
+        raise ValueError("不是小波格式的数据")
+    if version != VERSION:
+        raise ValueError(f"不支持的小波格式版本: {version}")
+    offset = HEADER.size
+    name_len = compressed[offset]
+    wavelet = bytes(compressed[offset + 1:offset + 1 + name_len]).decode()
+    offset += 1 + name_len
+
+    tile = (tile_rows, tile_cols)
+    regions = _tile_regions((rows, cols), tile)
+    lengths = struct.unpack_from(f'<{len(regions)}Q', compressed, offset)
+    offset += 8 * len(regions)
+    index = []
+    for length in lengths:
+        index.append((offset, length))
+        offset += length
+    return {
+        'shape': (rows, cols),
+        'dtype': np.dtype(f'<f{itemsize}'),
+        'wavelet': wavelet,
+        'level': level,
+        'mode': MODES[mode],
+        'tile': tile,
+        'threshold': threshold,
+        'step': step,
+        'regions': regions,
+        'index': index,
+    }
+
+
+def decode_tile(compressed: bytes, i: int, j: int) -> np.ndarray:
+    """只解码第(i, j)块"""
+    info = read_wavelet_header(compressed)
+    n_cols = -(-info['shape'][1] // info['tile'][1])
+    k = i * n_cols + j
+    offset, length = info['index'][k]
+    rows, cols = info['regions'][k]
+    return decompress_tile(bytes(compressed[offset:offset + length]),
+                           (rows.stop - rows.start, cols.stop - cols.start),
+                           info['wavelet'], info['level'], info['step'], info['dtype'])
+
+
+def decompress_wavelet(compressed: bytes, workers: int = None,
+                       executor: str = 'process') -> Tuple[np.ndarray, float]:
+    """分块小波解压"""
+    start = time.time()
+    info = read_wavelet_header(compressed)
+    workers = workers or os.cpu_count() or 1
+    view = memoryview(compressed)
+    args = [(bytes(view[offset:offset + length]),
+             (rows.stop - rows.start, cols.stop - cols.start),
+             info['wavelet'], info['level'], info['step'], info['dtype'])
+            for (offset, length), (rows, cols) in zip(info['index'], info['regions'])]
+    tiles = _map(decompress_tile, args, workers, executor)
+
+    decompressed = np.empty(info['shape'], dtype=info['dtype'])
+    for region, tile in zip(info['regions'], tiles):
+        decompressed[region] = tile
+    return decompressed, time.time() - start